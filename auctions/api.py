@@ -0,0 +1,257 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET, require_POST
+
+from .bidding import place_bids
+from .models import ArchivedBid, ArchivedComment, Bid, Comment, Listing
+from .pagination import InvalidCursor, keyset_page
+from .views import BidForm
+
+# Public field name -> ORM lookup, for each resource. Responses are built from
+# .values() straight off these, without instantiating any models.
+LISTING_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'price': 'price',
+    'image_url': 'image_url',
+    'category': 'category',
+    'owner': 'owner__username',
+    'is_active': 'is_active',
+    'ends_at': 'ends_at',
+    'bid_count': 'bid_count',
+    'winner': 'winner__username',
+    'timestamp': 'timestamp',
+}
+BID_FIELDS = {
+    'id': 'id',
+    'amount': 'amount',
+    'bidder': 'bidder__username',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'content': 'content',
+    'author': 'author__username',
+    'timestamp': 'timestamp',
+}
+
+LISTINGS_ORDERING = ('-timestamp', '-id')
+
+STATUS_FILTERS = {
+    'active': {'is_active': True},
+    'closed': {'is_active': False},
+    'all': {},
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(validators):
+    """
+    GET only, JSON errors, and ETag / If-None-Match handling for an endpoint.
+
+    As with conditional_page, `validators(request, *args, **kwargs)` returns a
+    cheap fingerprint of what the response would hold, and the ETag is made
+    from it and the URL before the view runs, so an unchanged poll costs that
+    one query rather than the view's queries and JSON encoding. None means
+    there is nothing to fingerprint (the view then reports the error).
+    """
+    def decorator(view):
+        @require_GET
+        def wrapper(request, *args, **kwargs):
+            fingerprint = validators(request, *args, **kwargs)
+            etag = None
+            if fingerprint is not None:
+                parts = [request.get_full_path(), fingerprint]
+                etag = quote_etag(hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest())
+                conditional = get_conditional_response(request, etag=etag)
+                if conditional is not None:
+                    return conditional
+            try:
+                data = view(request, *args, **kwargs)
+            except ApiError as e:
+                return JsonResponse({'error': str(e)}, status=e.status)
+            response = JsonResponse(data)
+            if etag:
+                response.headers['ETag'] = etag
+            return response
+        wrapper.__name__ = view.__name__
+        return wrapper
+    return decorator
+
+
+def listing_validators(request, listing_id):
+    # Saving the listing, a bid or a comment, closing and archiving all bump it.
+    return Listing.objects.filter(pk=listing_id).values_list('updated_at', flat=True).first()
+
+
+def listings_validators(request):
+    # The page's own rows, from the same keyset query as the view but only
+    # their ids and modification times.
+    try:
+        queryset = listings_queryset(request)
+        size = page_size(request)
+        rows, next_cursor = keyset_page(
+            queryset.values('id', 'updated_at', 'timestamp'), request.GET.get('cursor'), LISTINGS_ORDERING, size,
+        )
+    except (ApiError, InvalidCursor):
+        return None
+    return [(row['id'], row['updated_at']) for row in rows], next_cursor
+
+
+def selected_fields(request, available):
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(available)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}.")
+    return names
+
+
+def page_size(request):
+    try:
+        size = min(int(request.GET.get('limit', settings.LISTINGS_PAGE_SIZE)), settings.API_MAX_PAGE_SIZE)
+    except ValueError:
+        raise ApiError('limit must be a number.')
+    return max(size, 1)
+
+
+def page(request, queryset, available, ordering):
+    """
+    One cursor-paginated page of `queryset` as a list of dicts holding only
+    the requested fields, plus the URL of the next page.
+    """
+    names = selected_fields(request, available)
+    size = page_size(request)
+    # The cursor needs the ordering columns even when they weren't asked for.
+    keys = [key.lstrip('-') for key in ordering]
+    lookups = list(dict.fromkeys([available[name] for name in names] + keys))
+    try:
+        rows, next_cursor = keyset_page(queryset.values(*lookups), request.GET.get('cursor'), ordering, size)
+    except InvalidCursor:
+        raise ApiError('Invalid cursor.')
+    next_url = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        next_url = f'{request.path}?{query.urlencode()}'
+    return {
+        'results': [{name: row[available[name]] for name in names} for row in rows],
+        'next': next_url,
+    }
+
+
+def listing_rows(listing_id, live, archived):
+    # The listing's bids or comments: from `live`, or from `archived` once
+    # archive_auctions has moved them there. Both have the same fields.
+    row = Listing.objects.filter(pk=listing_id).values_list('archived_at').first()
+    if row is None:
+        raise ApiError('Listing not found.', status=404)
+    model = live if row[0] is None else archived
+    return model.objects.filter(listing_id=listing_id)
+
+
+def listings_queryset(request):
+    status = request.GET.get('status', 'active')
+    if status not in STATUS_FILTERS:
+        raise ApiError(f"status must be one of: {', '.join(STATUS_FILTERS)}.")
+    queryset = Listing.objects.filter(**STATUS_FILTERS[status])
+    if request.GET.get('category'):
+        queryset = queryset.filter(category=request.GET['category'])
+    return queryset
+
+
+@api_view(listings_validators)
+def listings(request):
+    return page(request, listings_queryset(request), LISTING_FIELDS, LISTINGS_ORDERING)
+
+
+@api_view(listing_validators)
+def listing(request, listing_id):
+    names = selected_fields(request, LISTING_FIELDS)
+    row = Listing.objects.filter(pk=listing_id).values(*[LISTING_FIELDS[name] for name in names]).first()
+    if row is None:
+        raise ApiError('Listing not found.', status=404)
+    return {name: row[LISTING_FIELDS[name]] for name in names}
+
+
+@api_view(listing_validators)
+def listing_bids(request, listing_id):
+    bids = listing_rows(listing_id, Bid, ArchivedBid)
+    return page(request, bids, BID_FIELDS, ('-amount', '-id'))
+
+
+@api_view(listing_validators)
+def listing_comments(request, listing_id):
+    comments = listing_rows(listing_id, Comment, ArchivedComment)
+    return page(request, comments, COMMENT_FIELDS, ('id',))
+
+
+def parse_bids(request):
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        raise ApiError('The request body must be JSON.')
+    items = payload.get('bids') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ApiError('Expected {"bids": [{"listing": <id>, "amount": <amount>}, ...]}.')
+    if len(items) > settings.API_MAX_BIDS:
+        raise ApiError(f'At most {settings.API_MAX_BIDS} bids per request.')
+    return [item if isinstance(item, dict) else {} for item in items]
+
+
+def listing_ref(item):
+    value = item.get('listing')
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value if isinstance(value, int) else None
+
+
+@require_POST
+def bids(request):
+    """
+    Places a batch of bids for the signed-in user in one transaction. Each
+    bid is checked with the same rules as the listing page's bid form, and
+    the response has one result per bid, in order: accepted, outbid, closed,
+    or rejected with the form's errors.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Sign in to place bids.'}, status=401)
+    try:
+        items = parse_bids(request)
+    except ApiError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    listings = Listing.objects.only('price', 'owner_id').in_bulk({listing_ref(item) for item in items} - {None})
+    results = []
+    valid = []
+    for item in items:
+        result = {'listing': item.get('listing'), 'amount': item.get('amount')}
+        results.append(result)
+        listing = listings.get(listing_ref(item))
+        if listing is None:
+            result.update(status='rejected', errors={'listing': ['No such listing.']})
+            continue
+        if listing.owner_id == user.pk:
+            result.update(status='rejected', errors={'listing': ['Cannot bid on your own listing.']})
+            continue
+        form = BidForm({'amount': item.get('amount')}, instance=Bid(listing=listing, bidder=user))
+        if not form.is_valid():
+            result.update(status='rejected', errors={field: list(errors) for field, errors in form.errors.items()})
+            continue
+        valid.append((result, listing.pk, form.cleaned_data['amount']))
+    placed = place_bids(user, [(listing_id, amount) for _, listing_id, amount in valid])
+    for (result, _, _), outcome in zip(valid, placed):
+        result.update(status=outcome.status, price=f'{outcome.price:.2f}')
+    return JsonResponse({'results': results})
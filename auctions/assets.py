@@ -0,0 +1,129 @@
+import gzip
+import mimetypes
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only text formats are worth compressing; images and fonts already are.
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml'}
+# Below this many bytes the compressed copy isn't worth a separate file.
+MIN_COMPRESS_SIZE = 256
+
+# Preferred first: brotli is smaller than gzip for the same file.
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Collects files under content-hashed names and writes a .gz (and, when the
+    brotli package is installed, a .br) copy next to each text file, so they can
+    be served precompressed without compressing on every request.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in [*self.hashed_files.values(), *paths]:
+            if self._compressible(name):
+                self._compress(name)
+
+    def _compressible(self, name):
+        return os.path.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS and self.exists(name)
+
+    def _compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            content = f.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        # mtime=0 keeps the .gz byte-identical between runs of collectstatic.
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(content):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+
+
+@lru_cache(maxsize=None)
+def _hashed_names():
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+@require_safe
+def serve(request, path):
+    """
+    Serves a collected static file from STATIC_ROOT, picking its precompressed
+    copy when the client accepts it. Content-hashed names change whenever the
+    file does, so they are cached for a year; anything else must revalidate.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    stat = os.stat(full_path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    encoding = None
+    best = 0
+    # The client's highest q-value wins; on a tie, the order of ENCODINGS does.
+    for name, suffix in ENCODINGS:
+        q = accepted.get(name, accepted.get('*', 0))
+        if q > best and os.path.isfile(full_path + suffix):
+            encoding, best = name, q
+    if encoding:
+        full_path += dict(ENCODINGS)[encoding]
+
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type or 'application/octet-stream')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    response.headers['Cache-Control'] = IMMUTABLE if path in _hashed_names() else 'public, no-cache'
+    return response
+
+
+def accepted_encodings(header):
+    """
+    Parses an Accept-Encoding header into {coding: q-value}. A coding without
+    a q parameter has q=1, and one whose q-value is malformed is ignored.
+    """
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = None
+        if q is not None:
+            accepted[coding.lower()] = q
+    return accepted
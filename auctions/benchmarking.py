@@ -0,0 +1,105 @@
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from .models import Bid, Comment, Listing, User
+
+BENCH_PASSWORD = 'bench-password'
+
+
+@contextmanager
+def test_database(on_disk=False):
+    """
+    Runs the block against a freshly migrated throwaway database, the same way
+    the test runner does, so benchmarks never touch the configured one. With
+    `on_disk`, an SQLite one is a temporary file instead of in memory, so its
+    locking and SQLITE_PRAGMAS (journal mode, busy timeout) are the real ones.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    if on_disk and connection.vendor == 'sqlite':
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'commerce-bench-{os.getpid()}.sqlite3')
+    try:
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        test_settings['NAME'] = old_test_name
+        teardown_test_environment()
+
+
+def seed_dataset(users, listings, bids, comments, watchers, batch_size=1000):
+    """
+    Bulk-creates a synthetic auction site: `listings` listings spread over
+    `users` users, each with up to `bids` bids and `comments` comments, and
+    `watchers` watched listings per user. Returns the created users.
+    """
+    rng = random.Random(0)
+    # Hashing is deliberately slow, so every user shares one hash.
+    password = make_password(BENCH_PASSWORD)
+    User.objects.bulk_create(
+        [User(username=f'user{i}', email=f'user{i}@example.com', password=password) for i in range(users)],
+        batch_size=batch_size,
+    )
+    people = list(User.objects.order_by('pk'))
+    categories = [code for code, _ in Listing.CATEGORIES]
+    Listing.objects.bulk_create(
+        [
+            Listing(
+                title=f'Listing {i}',
+                description=f'Synthetic listing number {i} for benchmarking.',
+                price=Decimal(rng.randint(1, 100)),
+                category=rng.choice(categories),
+                owner=rng.choice(people),
+            )
+            for i in range(listings)
+        ],
+        batch_size=batch_size,
+    )
+    items = list(Listing.objects.values_list('pk', 'price', 'owner_id'))
+    new_bids = []
+    new_comments = []
+    for listing_id, price, owner_id in items:
+        bidders = [person for person in people if person.pk != owner_id] or people
+        for n in range(rng.randint(0, bids)):
+            price += rng.randint(1, 10)
+            new_bids.append(Bid(listing_id=listing_id, bidder=rng.choice(bidders), amount=price))
+        for n in range(rng.randint(0, comments)):
+            new_comments.append(Comment(listing_id=listing_id, author=rng.choice(people), content=f'Comment {n}'))
+    Bid.objects.bulk_create(new_bids, batch_size=batch_size)
+    Comment.objects.bulk_create(new_comments, batch_size=batch_size)
+    # bulk_create skips Bid.save(), so bring the denormalized fields in line.
+    Listing.objects.rebuild_bid_aggregates()
+    Listing.objects.filter(highest_bid__isnull=False).update(
+        price=Subquery(Bid.objects.filter(pk=OuterRef('highest_bid')).values('amount')[:1])
+    )
+    Watch = Listing.watchers.through
+    listing_ids = [listing_id for listing_id, _, _ in items]
+    Watch.objects.bulk_create(
+        [
+            Watch(user_id=person.pk, listing_id=listing_id)
+            for person in people
+            for listing_id in rng.sample(listing_ids, min(watchers, len(listing_ids)))
+        ],
+        batch_size=batch_size,
+    )
+    return people
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
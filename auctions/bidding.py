@@ -0,0 +1,176 @@
+import random
+import time
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Bid, Listing, Notification, ProxyBid
+
+ACCEPTED = 'accepted'
+OUTBID = 'outbid'
+CLOSED = 'closed'
+
+
+class BidResult(NamedTuple):
+    status: str
+    # The listing's price after the attempt: the new bid if accepted, otherwise the price that beat it.
+    price: Decimal
+    bid: Optional[Bid] = None
+
+    @property
+    def accepted(self):
+        return self.status == ACCEPTED
+
+
+def place_bid(listing_id, bidder, amount):
+    """
+    Places a bid of `amount` by `bidder` on the listing and returns a BidResult.
+
+    The price check and the price write are one conditional UPDATE, so two
+    concurrent bids can never both win against the same old price. Other
+    bidders' maximum bids respond in the same transaction, so the result is
+    outbid if one of them beats or equals it. SQLite "database is locked" errors are
+    retried with a short jittered backoff. Raises Listing.DoesNotExist if there is no such listing.
+    """
+    return _retry_when_busy(_place_bid, listing_id, bidder, amount)
+
+
+def place_bids(bidder, bids):
+    """
+    Places each (listing_id, amount) in `bids` by `bidder`, in order, and
+    returns a BidResult for each. The whole batch is one transaction, so it
+    takes SQLite's write lock once rather than once per bid.
+    """
+    return _retry_when_busy(_place_bids, bidder, bids)
+
+
+def place_max_bid(listing_id, bidder, max_amount):
+    """
+    Records (or changes) `bidder`'s maximum bid on the listing, then lets it
+    compete with the other maximum bids, all in one transaction. Returns a
+    BidResult: accepted if `bidder` now leads, outbid otherwise.
+    """
+    return _retry_when_busy(_place_max_bid, listing_id, bidder, max_amount)
+
+
+def _retry_when_busy(place, *args):
+    attempt = 0
+    while True:
+        try:
+            return place(*args)
+        except OperationalError as e:
+            if not is_busy_error(e) or attempt >= settings.BID_BUSY_RETRIES:
+                raise
+            time.sleep(settings.BID_BUSY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+
+def is_busy_error(error):
+    message = str(error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def _place_bid(listing_id, bidder, amount):
+    # Inside place_bids() a failure aborts the whole batch anyway, so a
+    # savepoint per bid would only add statements.
+    with transaction.atomic(savepoint=False):
+        if Listing.objects.open_for_bids().filter(pk=listing_id, price__lt=amount).update(price=amount):
+            # The UPDATE holds the listing's write lock, so this is still the leader being outbid.
+            # An equal maximum of another bidder's was set before this bid, so it wins the tie.
+            tied = ProxyBid.objects.filter(listing=OuterRef('pk'), max_amount=amount).exclude(bidder=bidder)
+            leader_id, tied_bidder_id = (
+                Listing.objects.filter(pk=listing_id)
+                .annotate(tied_bidder=Subquery(tied.order_by('timestamp', 'id').values('bidder')[:1]))
+                .values_list('highest_bid__bidder_id', 'tied_bidder').get()
+            )
+            answer = None
+            if tied_bidder_id is not None:
+                # Its answering bid goes in first, and Bid.save() gives ties to the earlier bid.
+                answer = Bid.objects.create(listing_id=listing_id, bidder_id=tied_bidder_id, amount=amount)
+            bid = Bid.objects.create(listing_id=listing_id, bidder=bidder, amount=amount)
+            leading = _resolve_proxies(listing_id, amount, tied_bidder_id or bidder.pk) or answer
+            if leading is None or leading.bidder_id == bidder.pk:
+                result = BidResult(ACCEPTED, amount, bid)
+            else:
+                result = BidResult(OUTBID, leading.amount, bid)
+            _notify_outbid(listing_id, leader_id, leading.bidder_id if leading else bidder.pk, result.price)
+            return result
+    return _rejected(listing_id)
+
+
+def _place_bids(bidder, bids):
+    with transaction.atomic():
+        return [_place_bid(listing_id, bidder, amount) for listing_id, amount in bids]
+
+
+def _place_max_bid(listing_id, bidder, max_amount):
+    with transaction.atomic():
+        state = (
+            Listing.objects.open_for_bids().select_for_update(of=('self',))
+            .filter(pk=listing_id, price__lt=max_amount)
+            .values_list('price', 'highest_bid__bidder_id').first()
+        )
+        if state is None:
+            return _rejected(listing_id)
+        price, leader_id = state
+        ProxyBid.objects.bulk_create(
+            [ProxyBid(listing_id=listing_id, bidder=bidder, max_amount=max_amount)],
+            update_conflicts=True, unique_fields=['listing', 'bidder'], update_fields=['max_amount', 'timestamp'],
+        )
+        leading = _resolve_proxies(listing_id, price, leader_id)
+        if leading is not None:
+            _notify_outbid(listing_id, leader_id, leading.bidder_id, leading.amount)
+    if leading is None:
+        # Nobody else's maximum is above the price, so whoever led still does.
+        return BidResult(ACCEPTED if leader_id == bidder.pk else OUTBID, price)
+    return BidResult(ACCEPTED if leading.bidder_id == bidder.pk else OUTBID, leading.amount, leading)
+
+
+def _bid(listing_id, bidder, amount):
+    # The price check and the price write are one conditional UPDATE.
+    if Listing.objects.open_for_bids().filter(pk=listing_id, price__lt=amount).update(price=amount):
+        return Bid.objects.create(listing_id=listing_id, bidder=bidder, amount=amount)
+    return None
+
+
+def _resolve_proxies(listing_id, price, leader_id):
+    """
+    Settles the listing's maximum bids against each other and the current
+    `price` (led by `leader_id`) at once, instead of one bid per increment:
+    the runner-up bids its whole maximum, then the top maximum bids one
+    BID_INCREMENT over that, capped at its own maximum. Equal maximums go to
+    the one set first. Returns the new leading Bid, or None if nothing changed.
+    Runs inside the caller's transaction.
+    """
+    rivals = list(
+        ProxyBid.objects.filter(listing_id=listing_id, max_amount__gt=price)
+        .select_related('bidder').order_by('-max_amount', 'timestamp', 'id')[:2]
+    )
+    if not rivals or (len(rivals) == 1 and rivals[0].bidder_id == leader_id):
+        return None
+    top = rivals[0]
+    runner_up = rivals[1] if len(rivals) > 1 else None
+    target = min(top.max_amount, (runner_up.max_amount if runner_up else price) + settings.BID_INCREMENT)
+    if runner_up is not None and runner_up.max_amount < target:
+        _bid(listing_id, runner_up.bidder, runner_up.max_amount)
+    return _bid(listing_id, top.bidder, target)
+
+
+def _notify_outbid(listing_id, previous_leader_id, leader_id, price):
+    # Compares the leader before and after the whole placement, not bid by bid:
+    # while maximum bids settle, a bidder can briefly lose a lead their own
+    # maximum takes straight back, and that shouldn't email them.
+    if previous_leader_id is not None and previous_leader_id != leader_id:
+        Notification.objects.create(
+            kind=Notification.OUTBID, recipient_id=previous_leader_id, listing_id=listing_id, amount=price,
+        )
+
+
+def _rejected(listing_id):
+    is_active, ends_at, price = Listing.objects.values_list('is_active', 'ends_at', 'price').get(pk=listing_id)
+    is_open = is_active and (ends_at is None or ends_at > timezone.now())
+    return BidResult(OUTBID if is_open else CLOSED, price)
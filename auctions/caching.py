@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Subquery
+
+from .models import Listing
+from .routers import primary_reads
+
+CATEGORY_COUNTS_KEY = 'categories:counts'
+
+
+def listing_snapshot_key(listing_id, updated_at):
+    # Every write that changes the listing page bumps updated_at, in whichever
+    # process it happens, so a new write means a new key.
+    return f'listing:{listing_id}:snapshot:{updated_at.isoformat()}'
+
+
+def category_counts():
+    """
+    Returns {category code: number of active listings}, from a single GROUP BY
+    query cached under a marker of the newest listing and the latest close.
+    The marker comes from the database, so listings created or closed by any
+    process (the auction closer, imports, other workers) show at once.
+    """
+    with primary_reads():
+        key = _category_counts_key()
+        counts = cache.get(key)
+        if counts is None:
+            counts = dict(Listing.objects.active().order_by().values_list('category').annotate(n=Count('id')))
+            cache.set(key, counts, settings.LISTING_CACHE_TIMEOUT)
+    return counts
+
+
+def _category_counts_key():
+    # Two index lookups in one query: the highest id, and the newest
+    # updated_at among closed listings (closing a listing sets it).
+    last_closed = Listing.objects.filter(is_active=False).order_by('-updated_at').values('updated_at')[:1]
+    last_id, last_closed = (
+        Listing.objects.order_by('-pk').annotate(last_closed=Subquery(last_closed))
+        .values_list('pk', 'last_closed').first()
+    ) or (None, None)
+    return f'{CATEGORY_COUNTS_KEY}:{last_id}:{last_closed.timestamp() if last_closed else None}'
+
+
+def invalidate_category_counts():
+    # Deleting a listing leaves the marker as it was, unless it was the newest.
+    with primary_reads():
+        cache.delete(_category_counts_key())
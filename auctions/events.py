@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+from .models import Listing
+
+
+class ListingEventHub:
+    """
+    In-process publish/subscribe of listing state changes for the
+    Server-Sent Events stream. Subscribers are asyncio queues on the ASGI
+    event loop; publishers may be sync views running in worker threads.
+
+    Only bids and closes handled by this process are seen, so with several
+    worker processes each watcher only hears about its own worker's writes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, listing_id):
+        # Every event carries the listing's full state, so a watcher only
+        # ever needs the latest one: a queue of one that keeps the newest.
+        queue = asyncio.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers.setdefault(listing_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, listing_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(listing_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(listing_id, None)
+
+    def has_subscribers(self, listing_id):
+        return listing_id in self._subscribers
+
+    def publish(self, listing_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(listing_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+def _offer(queue, event):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+hub = ListingEventHub()
+
+
+def listing_state(listing_id):
+    state = Listing.objects.values('price', 'bid_count', 'is_active').get(pk=listing_id)
+    state['price'] = f"{state['price']:.2f}"
+    return state
+
+
+def publish_listing_state(listing_id):
+    # Skip the query entirely when nobody on this worker is watching.
+    if hub.has_subscribers(listing_id):
+        hub.publish(listing_id, listing_state(listing_id))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with PASSWORD_ITERATIONS rounds. It keeps Django's algorithm
+    name, so existing hashes still verify, and a password hashed with any other
+    count is rehashed with the configured one on the user's next login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_ITERATIONS
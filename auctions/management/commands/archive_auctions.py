@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from auctions.models import ArchivedBid, ArchivedComment, Bid, Comment, Listing, ProxyBid
+
+
+def archive_closed_auctions(older_than, batch_size):
+    """
+    Moves the bids and comments of up to `batch_size` auctions that closed
+    (and haven't changed since) more than `older_than` ago into the archive
+    tables, and deletes their maximum bids, in one transaction. Returns the
+    ids of the listings archived.
+    """
+    now = timezone.now()
+    archivable = Listing.objects.filter(is_active=False, archived_at__isnull=True, updated_at__lte=now - older_than)
+    ids = list(archivable.order_by('pk').values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return []
+    with transaction.atomic():
+        # Marking the listings first stops comments being added to them meanwhile.
+        # The filter is checked again by the UPDATE, so a listing another run has
+        # archived, or that changed, since the ids were picked is left out.
+        # price, winner and bid_count stay on the listing as its summary.
+        archivable.filter(pk__in=ids).update(archived_at=now, highest_bid=None, updated_at=now)
+        ids = list(Listing.objects.filter(pk__in=ids, archived_at=now).values_list('pk', flat=True))
+        ArchivedBid.objects.bulk_create([
+            ArchivedBid(id=pk, amount=amount, listing_id=listing_id, bidder_id=bidder_id)
+            for pk, amount, listing_id, bidder_id
+            in Bid.objects.filter(listing_id__in=ids).values_list('pk', 'amount', 'listing_id', 'bidder_id')
+        ], batch_size=1000)
+        ArchivedComment.objects.bulk_create([
+            ArchivedComment(id=pk, content=content, listing_id=listing_id, author_id=author_id, timestamp=timestamp)
+            for pk, content, listing_id, author_id, timestamp
+            in Comment.objects.filter(listing_id__in=ids)
+            .values_list('pk', 'content', 'listing_id', 'author_id', 'timestamp')
+        ], batch_size=1000)
+        Bid.objects.filter(listing_id__in=ids).delete()
+        Comment.objects.filter(listing_id__in=ids).delete()
+        # Maximum bids mean nothing once the auction has closed. Queued
+        # notifications stay; dispatch_notifications deletes them once sent.
+        ProxyBid.objects.filter(listing_id__in=ids).delete()
+    return ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the bids and comments of auctions closed more than --days days ago "
+        "into the archive tables, in batches, so the live tables only hold open "
+        "and recently closed auctions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=30,
+                            help='Archive auctions closed and unchanged for this many days (default: 30).')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Auctions archived per transaction (default: 100).')
+
+    def handle(self, *args, days, batch_size, **options):
+        archived = 0
+        while True:
+            ids = archive_closed_auctions(timedelta(days=days), batch_size)
+            archived += len(ids)
+            if len(ids) < batch_size:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} auction(s).'))
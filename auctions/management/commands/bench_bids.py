@@ -0,0 +1,102 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from auctions.benchmarking import test_database
+from auctions.bidding import ACCEPTED, place_bid
+from auctions.models import Bid, Listing, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammers a single listing with concurrent bids through bidding.place_bid(), "
+        "optionally alongside threads reading it the way the listing page does, and checks "
+        "that no accepted bid was lost. Runs against a throwaway database file with the "
+        "configured database's settings (compare COMMERCE_DB_PROFILE settings with it)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--bids', type=int, default=200, help='Bids placed by each thread.')
+        parser.add_argument('--readers', type=int, default=0, help='Threads reading the listing meanwhile.')
+
+    def handle(self, *args, threads, bids, readers, **options):
+        with test_database(on_disk=True):
+            self.bench(threads, bids, readers)
+
+    def bench(self, threads, bids, readers):
+        owner = User.objects.create_user('bench-owner')
+        bidders = [User.objects.create_user(f'bench-bidder-{i}') for i in range(threads)]
+        listing = Listing.objects.create(title='Bench', description='', price=Decimal('1.00'), owner=owner)
+        accepted = [[] for _ in range(threads)]
+        reads = [0] * readers
+        errors = []
+        bidding = threading.Event()
+        bidding.set()
+        start = threading.Barrier(threads + readers + 1)
+
+        def bidder_loop(index):
+            start.wait()
+            try:
+                for i in range(bids):
+                    # Overlapping ranges across threads, so bids race for the same prices.
+                    amount = Decimal(2 + i * threads + random.randint(0, threads)).quantize(Decimal('0.01'))
+                    result = place_bid(listing.pk, bidders[index], amount)
+                    if result.status == ACCEPTED:
+                        accepted[index].append(amount)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        def reader_loop(index):
+            start.wait()
+            try:
+                while bidding.is_set():
+                    Listing.objects.with_related().get(pk=listing.pk)
+                    list(listing.comments.for_display())
+                    reads[index] += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=bidder_loop, args=(i,)) for i in range(threads)]
+        reader_threads = [threading.Thread(target=reader_loop, args=(i,)) for i in range(readers)]
+        for worker in workers + reader_threads:
+            worker.start()
+        start.wait()
+        began = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - began
+        bidding.clear()
+        for reader in reader_threads:
+            reader.join()
+
+        if errors:
+            raise CommandError(f'{len(errors)} thread(s) failed, first error: {errors[0]!r}')
+        listing.refresh_from_db()
+        all_accepted = [amount for amounts in accepted for amount in amounts]
+        stored = Bid.objects.filter(listing=listing).count()
+        total = threads * bids
+        self.stdout.write(
+            f'{total} bids from {threads} threads in {elapsed:.2f}s '
+            f'({total / elapsed:.0f} bids/s), {len(all_accepted)} accepted'
+        )
+        if readers:
+            self.stdout.write(f'{sum(reads)} listing reads from {readers} threads ({sum(reads) / elapsed:.0f} reads/s)')
+        problems = []
+        if stored != len(all_accepted) or listing.bid_count != stored:
+            problems.append(f'{len(all_accepted)} accepted, {stored} stored, bid_count {listing.bid_count}')
+        if all_accepted and listing.price != max(all_accepted):
+            problems.append(f'price {listing.price} but highest accepted bid {max(all_accepted)}')
+        if listing.highest_bid is not None and listing.highest_bid.amount != listing.price:
+            problems.append(f'highest_bid {listing.highest_bid.amount} but price {listing.price}')
+        if problems:
+            raise CommandError('Lost updates: ' + '; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('No lost updates.'))
@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from auctions.benchmarking import percentile, seed_dataset, test_database
+from auctions.models import Listing
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway database, measures index and listing page latency on its "
+        "own and then while other threads flood the login form with wrong passwords, "
+        "and reports both as JSON. Compare with --no-throttle to see what the "
+        "login throttle protects. The flood runs for --warmup seconds before page "
+        "latency is measured, so the report shows how browsing holds up once the "
+        "throttle's bursts are used up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=5, help='Seconds to measure each phase for.')
+        parser.add_argument('--browsers', type=int, default=2, help='Threads browsing pages.')
+        parser.add_argument('--flooders', type=int, default=8, help='Threads posting to the login form.')
+        parser.add_argument('--ips', type=int, default=1, help='Distinct client addresses the flood comes from.')
+        parser.add_argument('--warmup', type=float, default=10, help='Seconds the flood runs before measuring.')
+        parser.add_argument('--no-throttle', action='store_true', help='Turn off AUTH_THROTTLE_RATES.')
+
+    def handle(self, *args, duration, browsers, flooders, ips, warmup, no_throttle, **options):
+        with test_database():
+            people = seed_dataset(users=50, listings=200, bids=10, comments=5, watchers=5)
+            listing_id = Listing.objects.filter(is_active=True).values_list('pk', flat=True)[0]
+            urls = [reverse('index'), reverse('listing', args=[listing_id])]
+            usernames = [person.username for person in people]
+            with override_settings(**({'AUTH_THROTTLE_RATES': {}} if no_throttle else {})):
+                cache.clear()
+                baseline = self.run(urls, usernames, duration, 0, browsers, 0, ips)
+                cache.clear()
+                flood = self.run(urls, usernames, duration, warmup, browsers, flooders, ips)
+        self.stdout.write(json.dumps({'throttled': not no_throttle, 'baseline': baseline, 'flood': flood}, indent=2))
+
+    def run(self, urls, usernames, duration, warmup, browsers, flooders, ips):
+        timings = []
+        logins = Counter()
+        running = threading.Event()
+        running.set()
+        measuring = threading.Event()
+        start = threading.Barrier(browsers + flooders + 1)
+
+        def browse():
+            client = Client()
+            start.wait()
+            try:
+                n = 0
+                while running.is_set():
+                    began = time.perf_counter()
+                    client.get(urls[n % len(urls)])
+                    if measuring.is_set():
+                        timings.append((time.perf_counter() - began) * 1000)
+                    n += 1
+            finally:
+                connection.close()
+
+        def flood(index):
+            client = Client()
+            start.wait()
+            try:
+                n = 0
+                while running.is_set():
+                    response = client.post(
+                        reverse('login'),
+                        {'username': usernames[(index + n) % len(usernames)], 'password': 'wrong'},
+                        REMOTE_ADDR=f'10.0.0.{(index + n) % ips + 1}',
+                    )
+                    if measuring.is_set():
+                        logins[response.status_code] += 1
+                    n += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=browse) for _ in range(browsers)]
+        threads += [threading.Thread(target=flood, args=(i,)) for i in range(flooders)]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        time.sleep(warmup)
+        measuring.set()
+        time.sleep(duration)
+        running.clear()
+        for thread in threads:
+            thread.join()
+        return {
+            'page_views': len(timings),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'login_attempts': dict(sorted(logins.items())),
+        }
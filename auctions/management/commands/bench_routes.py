@@ -0,0 +1,158 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from auctions import urls
+from auctions.benchmarking import percentile, seed_dataset, test_database
+from auctions.models import Listing
+
+# How to request each named route: (method, login required, URL kwargs, query string).
+# URL kwargs of None are filled in from the seeded data.
+ROUTES = {
+    'index': ('GET', False, {}, ''),
+    'login': ('GET', False, {}, ''),
+    'logout': ('GET', True, {}, ''),
+    'register': ('GET', False, {}, ''),
+    'add_listing': ('GET', True, {}, ''),
+    'listing': ('GET', True, {'listing_id': None}, ''),
+    'listing_events': ('GET', False, {'listing_id': None}, ''),
+    'search': ('GET', False, {}, 'q=synthetic+listing'),
+    'categories': ('GET', False, {}, ''),
+    'category': ('GET', False, {'category': 'Toys'}, ''),
+    'watchlist': ('GET', True, {}, ''),
+    'watchlist_add': ('GET', True, {'listing_id': None}, ''),
+    'watchlist_remove': ('GET', True, {'listing_id': None}, ''),
+    'dashboard': ('GET', True, {}, ''),
+    'api_listings': ('GET', False, {}, ''),
+    'api_listing': ('GET', False, {'listing_id': None}, ''),
+    'api_listing_bids': ('GET', False, {'listing_id': None}, ''),
+    'api_listing_comments': ('GET', False, {'listing_id': None}, ''),
+    'api_bids': ('POST', True, {}, ''),
+}
+
+# JSON bodies for POST routes, given the seeded listing's id. After the first
+# request, every bid in the batch is outbid, which exercises the same path.
+ROUTE_BODIES = {
+    'api_bids': lambda listing_id: {'bids': [{'listing': listing_id, 'amount': str(10 ** 6 + n)} for n in range(20)]},
+}
+
+# The most queries any single request to a route may issue. These don't grow
+# with the dataset, so exceeding one usually means a new N+1 query.
+QUERY_BUDGETS = {
+    # The page of listings and the trending section.
+    'index': 2,
+    'login': 0,
+    'logout': 3,
+    'register': 0,
+    'add_listing': 1,
+    'listing': 5,
+    'listing_events': 1,
+    'search': 2,
+    'categories': 2,
+    'category': 2,
+    'watchlist': 3,
+    # Re-adding a watched listing costs an extra lookup to tell it apart from a missing one.
+    'watchlist_add': 6,
+    'watchlist_remove': 5,
+    # The session, then one query for each of the three sections.
+    'dashboard': 4,
+    # Each GET endpoint first runs its ETag validator, so a 304 costs that query alone.
+    'api_listings': 2,
+    'api_listing': 2,
+    'api_listing_bids': 3,
+    'api_listing_comments': 3,
+    # Three writes plus lookups of the leader being outbid and of maximum bids for each
+    # of the 20 bids in the batch, and the notification for the one other bidder they outbid.
+    'api_bids': 105,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway database with synthetic auctions, requests every named "
+        "route in auctions/urls.py and reports p50/p95 latency and query counts as "
+        "JSON. Fails if a route goes over its query budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--listings', type=int, default=2000)
+        parser.add_argument('--bids', type=int, default=20, help='Maximum bids per listing.')
+        parser.add_argument('--comments', type=int, default=10, help='Maximum comments per listing.')
+        parser.add_argument('--watchers', type=int, default=20, help='Watched listings per user.')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per route.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--no-budgets', action='store_true', help="Report only; don't enforce query budgets.")
+
+    def handle(self, *args, **options):
+        names = [pattern.name for pattern in urls.urlpatterns if pattern.name]
+        missing = [name for name in names if name not in ROUTES]
+        if missing:
+            raise CommandError(f"No benchmark recipe for route(s): {', '.join(missing)}. Add them to ROUTES.")
+        with test_database():
+            started = time.perf_counter()
+            people = seed_dataset(
+                options['users'], options['listings'], options['bids'], options['comments'], options['watchers']
+            )
+            self.stderr.write(f'Seeded dataset in {time.perf_counter() - started:.1f}s')
+            listing_id = (
+                Listing.objects.filter(is_active=True).exclude(owner=people[0])
+                .order_by('-bid_count').values_list('pk', flat=True)[0]
+            )
+            results = {name: self.profile(name, people[0], listing_id, options['requests']) for name in names}
+
+        report = json.dumps({
+            'dataset': {key: options[key] for key in ('users', 'listings', 'bids', 'comments', 'watchers')},
+            'requests_per_route': options['requests'],
+            'routes': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+        over = [
+            f"{name} ({result['queries_max']} > {QUERY_BUDGETS[name]})"
+            for name, result in results.items()
+            if name in QUERY_BUDGETS and result['queries_max'] > QUERY_BUDGETS[name]
+        ]
+        if over and not options['no_budgets']:
+            raise CommandError(f"Query budget exceeded: {', '.join(over)}")
+
+    def profile(self, name, user, listing_id, requests):
+        method, login_required, kwargs, query = ROUTES[name]
+        kwargs = {key: listing_id if value is None else value for key, value in kwargs.items()}
+        url = reverse(name, kwargs=kwargs) + (f'?{query}' if query else '')
+        # Start every route from a cold cache, so the first request pays for misses.
+        cache.clear()
+        timings = []
+        queries = []
+        statuses = set()
+        for _ in range(requests):
+            client = Client()
+            if login_required:
+                client.force_login(user)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                if name in ROUTE_BODIES:
+                    response = client.post(url, ROUTE_BODIES[name](listing_id), content_type='application/json')
+                else:
+                    response = getattr(client, method.lower())(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+        return {
+            'url': url,
+            'statuses': sorted(statuses),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'queries_min': min(queries),
+            'queries_max': max(queries),
+        }
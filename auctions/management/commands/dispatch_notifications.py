@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from auctions.models import Notification
+
+SUBJECTS = {
+    Notification.OUTBID: 'You were outbid on {title}',
+    Notification.WON: 'You won {title}',
+}
+
+
+def dispatch_notifications(batch_size):
+    """
+    Emails up to `batch_size` notifications from the outbox, oldest first, and
+    deletes them. Notifications of the same kind for the same user and listing
+    become one email, and outbids are dropped for a listing the user has won.
+    Returns (notifications taken off the outbox, emails sent).
+
+    Delivery is at least once: if sending fails, the batch stays in the
+    outbox and is retried next time.
+    """
+    batch = list(
+        Notification.objects.select_related('recipient', 'listing')
+        .only('kind', 'amount', 'recipient__username', 'recipient__email', 'listing__title', 'listing__price')
+        .order_by('id')[:batch_size]
+    )
+    if not batch:
+        return 0, 0
+    groups = {}
+    for notification in batch:
+        groups.setdefault((notification.recipient_id, notification.listing_id, notification.kind), []).append(notification)
+    messages = []
+    for (recipient_id, listing_id, kind), notifications in groups.items():
+        if kind == Notification.OUTBID and (recipient_id, listing_id, Notification.WON) in groups:
+            continue
+        recipient = notifications[0].recipient
+        listing = notifications[0].listing
+        if not recipient.email:
+            continue
+        body = render_to_string(f'auctions/email/{kind}.txt', {
+            'recipient': recipient,
+            'listing': listing,
+            'count': len(notifications),
+            'amount': max(notification.amount for notification in notifications),
+            'url': settings.SITE_URL + reverse('listing', args=[listing_id]),
+        })
+        messages.append(EmailMessage(SUBJECTS[kind].format(title=listing.title), body, to=[recipient.email]))
+    if messages:
+        # One connection for the whole batch, rather than one per email.
+        get_connection().send_messages(messages)
+    Notification.objects.filter(pk__in=[notification.pk for notification in batch]).delete()
+    return len(batch), len(messages)
+
+
+class Command(BaseCommand):
+    help = "Emails queued outbid and won notifications, in batches, until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Notifications taken off the outbox at a time (default: 500).')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when the outbox is empty (default: 5).')
+        parser.add_argument('--once', action='store_true', help='Send everything queued now and exit.')
+
+    def handle(self, *args, batch_size, interval, once, **options):
+        while True:
+            taken, sent = dispatch_notifications(batch_size)
+            if taken:
+                self.stdout.write(f'Sent {sent} email(s) for {taken} notification(s).')
+            # A full batch means there is probably a backlog: carry on straight away.
+            if taken < batch_size:
+                if once:
+                    break
+                time.sleep(interval)
@@ -0,0 +1,217 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.db import connections, router, transaction
+from django.db import models
+from django.db.models import OuterRef, Subquery
+
+from auctions.models import Bid, Listing, User, validate_end_time
+from auctions.views import ListingForm
+
+
+def read_rows(path, fmt):
+    # Yields (line number, row dict) one at a time, so files of any size stream through.
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield row, None
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield {'line': line_number}, f'Invalid JSON: {e}'
+                    continue
+                if not isinstance(row, dict):
+                    yield {'line': line_number}, 'Expected a JSON object'
+                    continue
+                yield row, None
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def insert_rows(model, rows):
+    """
+    Inserts `rows` (dicts of field attname to cleaned value) with one
+    executemany(). bulk_create() spends most of its time compiling SQL for
+    SQLite's small parameter batches; this prepares each value once instead.
+    Must run inside a transaction. Returns the new primary keys, in order.
+    """
+    if not rows:
+        return []
+    db = connections[router.db_for_write(model)]
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    now = timezone.now()
+    defaults = {
+        field.attname: field.get_db_prep_save(
+            now if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False) else field.get_default(),
+            db,
+        )
+        for field in fields
+    }
+    # Cleaned strings are already what SQLite stores; only other types need adapting.
+    adapters = {field.attname: None if isinstance(field, models.CharField) else field.get_db_prep_save for field in fields}
+
+    def prepare(row):
+        values = []
+        for field in fields:
+            name = field.attname
+            if name not in row:
+                values.append(defaults[name])
+            elif adapters[name] is None:
+                values.append(row[name])
+            else:
+                values.append(adapters[name](row[name], db))
+        return values
+
+    table = db.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(db.ops.quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    pk = db.ops.quote_name(model._meta.pk.column)
+    with db.cursor() as c:
+        c.executemany(
+            f'INSERT INTO {table} ({columns}) VALUES ({placeholders})',
+            [prepare(row) for row in rows],
+        )
+        # This transaction has held the write lock since the first insert, so
+        # the new rows have the highest, consecutive ids.
+        c.execute(f'SELECT MAX({pk}) FROM {table}')
+        last_id = c.fetchone()[0]
+    return list(range(last_id - len(rows) + 1, last_id + 1))
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams listings (and optionally their historical bids) from CSV or JSONL files "
+        "into the database in batched transactions. Rows are validated with the same rules "
+        "as the Create Listing form; invalid rows go to the rejects file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('listings', help="Listings file with the Create Listing form's fields, plus "
+                                             "optional 'owner' (username) and 'ref' (used by the bids file).")
+        parser.add_argument('--bids', help="Bids file with 'listing' (a ref from the listings file), "
+                                           "'bidder' (username) and 'amount'.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: by file extension).')
+        parser.add_argument('--owner', help="Owner username for rows without an 'owner'.")
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows written per transaction.')
+        parser.add_argument('--rejects', default='rejects.jsonl', help='Where to write rejected rows as JSONL.')
+
+    def handle(self, *args, **options):
+        self.users = {}
+        self.default_owner = self.user_id(options['owner']) if options['owner'] else None
+        if options['owner'] and self.default_owner is None:
+            raise CommandError(f"No user named {options['owner']!r}.")
+        self.refs = {}
+        self.rejected = 0
+        with open(options['rejects'], 'w', encoding='utf-8') as self.rejects:
+            listings = self.import_rows(options['listings'], options, self.build_listing, self.write_listings)
+            bids = 0
+            if options['bids']:
+                bids = self.import_rows(options['bids'], options, self.build_bid, self.write_bids)
+        message = f'Imported {listings} listing(s) and {bids} bid(s).'
+        if self.rejected:
+            message += f" Rejected {self.rejected} row(s), see {options['rejects']}."
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def import_rows(self, path, options, build, write):
+        started = time.perf_counter()
+        imported = 0
+        rows = read_rows(path, options['format'])
+        for batch in batched(enumerate(rows, 1), options['batch_size']):
+            valid = []
+            for number, (row, error) in batch:
+                try:
+                    if error:
+                        raise ValidationError(error)
+                    valid.append((row, build(row)))
+                except ValidationError as e:
+                    self.reject(path, number, row, e)
+            with transaction.atomic():
+                write(valid)
+            imported += len(valid)
+            rate = imported / max(time.perf_counter() - started, 1e-9)
+            self.stderr.write(f'{path}: {imported} imported ({rate:,.0f} rows/s)', ending='\r')
+        self.stderr.write('')
+        return imported
+
+    def reject(self, path, number, row, error):
+        self.rejected += 1
+        errors = error.message_dict if hasattr(error, 'error_dict') else {'__all__': error.messages}
+        self.rejects.write(json.dumps({'file': path, 'row': number, 'data': row, 'errors': errors}) + '\n')
+
+    def user_id(self, username):
+        if username not in self.users:
+            self.users[username] = User.objects.filter(username=username).values_list('pk', flat=True).first()
+        return self.users[username]
+
+    def clean_fields(self, model, row, names):
+        # Model field validation is what ModelForm runs too (choices, max_length,
+        # URL format, validate_price), without building a form per row.
+        values = {}
+        errors = {}
+        for name in names:
+            field = model._meta.get_field(name)
+            value = row.get(name, '')
+            if value in ('', None) and field.null:
+                value = None
+            try:
+                values[name] = field.clean(value, None)
+            except ValidationError as e:
+                errors[name] = e.messages
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def build_listing(self, row):
+        owner_id = self.user_id(row['owner']) if row.get('owner') else self.default_owner
+        if owner_id is None:
+            raise ValidationError({'owner': ['Unknown owner.' if row.get('owner') else 'No owner given.']})
+        listing = self.clean_fields(Listing, row, ListingForm.Meta.fields)
+        # ListingForm's own check, on top of the model field validation.
+        try:
+            validate_end_time(listing['ends_at'])
+        except ValidationError as e:
+            raise ValidationError({'ends_at': e.messages})
+        return dict(listing, owner_id=owner_id)
+
+    def write_listings(self, valid):
+        ids = insert_rows(Listing, [listing for _, listing in valid])
+        for (row, _), listing_id in zip(valid, ids):
+            if row.get('ref'):
+                self.refs[str(row['ref'])] = listing_id
+
+    def build_bid(self, row):
+        listing_id = self.refs.get(str(row.get('listing', '')))
+        bidder_id = self.user_id(row.get('bidder', ''))
+        errors = {}
+        if listing_id is None:
+            errors['listing'] = ['No imported listing with this ref.']
+        if bidder_id is None:
+            errors['bidder'] = ['Unknown bidder.']
+        if errors:
+            raise ValidationError(errors)
+        return dict(self.clean_fields(Bid, row, ['amount']), listing_id=listing_id, bidder_id=bidder_id)
+
+    def write_bids(self, valid):
+        bids = [bid for _, bid in valid]
+        insert_rows(Bid, bids)
+        # Raw inserts skip Bid.save(), so update the denormalized fields here,
+        # and bring each price up to its highest historical bid.
+        highest = Subquery(Bid.objects.filter(pk=OuterRef('highest_bid')).values('amount')[:1])
+        for listing_ids in batched({bid['listing_id'] for bid in bids}, 500):
+            listings = Listing.objects.filter(pk__in=listing_ids)
+            listings.rebuild_bid_aggregates()
+            listings.filter(highest_bid__isnull=False, price__lt=highest).update(price=highest)
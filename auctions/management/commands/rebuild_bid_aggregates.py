@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auctions.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Recomputes each listing's bid_count and highest_bid from the Bid table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Listings updated per transaction (default: 1000).')
+
+    def handle(self, *args, batch_size, **options):
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                Listing.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # Short transactions so bids on other listings are not held up behind the rebuild.
+            with transaction.atomic():
+                updated += Listing.objects.filter(pk__in=ids).rebuild_bid_aggregates()
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt bid aggregates for {updated} listing(s).'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from auctions.search import SEARCH_TABLE
+
+
+class Command(BaseCommand):
+    help = (
+        "Indexes existing listings for full-text search in batches. Safe to re-run "
+        "and to run while the site is live; new writes are indexed by triggers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Listings indexed per transaction (default: 5000).')
+
+    def handle(self, *args, batch_size, **options):
+        indexed = 0
+        last_id = 0
+        with connection.cursor() as c:
+            while True:
+                c.execute(
+                    'SELECT MAX(id) FROM (SELECT id FROM auctions_listing WHERE id > %s ORDER BY id LIMIT %s)',
+                    [last_id, batch_size],
+                )
+                batch_end = c.fetchone()[0]
+                if batch_end is None:
+                    break
+                # Replacing the whole id range in one transaction makes re-runs
+                # idempotent and can't race the triggers for the same rows.
+                with transaction.atomic():
+                    c.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid > %s AND rowid <= %s', [last_id, batch_end])
+                    c.execute(
+                        f'INSERT INTO {SEARCH_TABLE} (rowid, title, description) '
+                        'SELECT id, title, description FROM auctions_listing WHERE id > %s AND id <= %s',
+                        [last_id, batch_end],
+                    )
+                    indexed += c.rowcount
+                last_id = batch_end
+                self.stdout.write(f'Indexed listings up to id {last_id}', ending='\r')
+            c.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} listing(s).'))
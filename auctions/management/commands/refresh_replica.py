@@ -0,0 +1,43 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the primary SQLite database over each file in COMMERCE_REPLICA_DBS, "
+        "either once or every --interval seconds, to stand in for replication locally."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep refreshing, this many seconds apart.')
+
+    def handle(self, *args, interval, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('No replicas configured. Set COMMERCE_REPLICA_DBS to a comma-separated list of files.')
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('refresh_replica only copies SQLite databases.')
+        while True:
+            started = time.perf_counter()
+            for alias in settings.REPLICA_DATABASES:
+                self.copy(connections['default'].settings_dict['NAME'], connections[alias].settings_dict['NAME'])
+            self.stdout.write(
+                f'Refreshed {len(settings.REPLICA_DATABASES)} replica(s) in {time.perf_counter() - started:.2f}s.'
+            )
+            if interval is None:
+                break
+            time.sleep(interval)
+
+    def copy(self, source_path, replica_path):
+        # SQLite's online backup takes a consistent snapshot without blocking
+        # writers for long, and readers of the replica never see a half-written file.
+        source = sqlite3.connect(source_path)
+        replica = sqlite3.connect(replica_path)
+        try:
+            source.backup(replica, pages=1024)
+        finally:
+            replica.close()
+            source.close()
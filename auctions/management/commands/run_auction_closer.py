@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from auctions.events import publish_listing_state
+from auctions.models import Listing, Notification
+
+
+def close_expired_auctions(batch_size):
+    """
+    Closes up to `batch_size` expired auctions, making each highest bidder the
+    winner, and returns the ids of the listings it closed.
+    """
+    ids = list(Listing.objects.expired().order_by('ends_at').values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return []
+    closed_at = timezone.now()
+    with transaction.atomic():
+        # A single set-based UPDATE, so the write lock is held for one statement
+        # however big the batch. Re-checking expired() keeps it safe against an
+        # owner closing one of these auctions by hand in the meantime.
+        Listing.objects.expired().filter(pk__in=ids).close(closed_at)
+        # Only the auctions this UPDATE closed carry its timestamp; one the owner
+        # closed meanwhile already queued its own notification.
+        won = Listing.objects.filter(pk__in=ids, updated_at=closed_at, winner__isnull=False)
+        Notification.objects.bulk_create([
+            Notification(kind=Notification.WON, recipient_id=winner_id, listing_id=listing_id, amount=price)
+            for listing_id, winner_id, price in won.values_list('pk', 'winner_id', 'price')
+        ])
+    # update() bypasses the post_save signal, so notify here.
+    for listing_id in ids:
+        publish_listing_state(listing_id)
+    return ids
+
+
+class Command(BaseCommand):
+    help = "Closes auctions whose end time has passed, in batches, until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Auctions closed per transaction (default: 500).')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when there is nothing to close (default: 5).')
+        parser.add_argument('--once', action='store_true', help='Close everything expired now and exit.')
+
+    def handle(self, *args, batch_size, interval, once, **options):
+        while True:
+            closed = close_expired_auctions(batch_size)
+            if closed:
+                self.stdout.write(f'Closed {len(closed)} auction(s).')
+            # A full batch means there is probably a backlog: carry on straight away.
+            if len(closed) < batch_size:
+                if once:
+                    break
+                time.sleep(interval)
@@ -0,0 +1,111 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .routers import RequestRouting, current_routing
+from .timing import RequestStats, current_stats
+
+timing_logger = logging.getLogger('auctions.timing')
+
+
+class RequestTimingMiddleware:
+    """
+    Records query count, SQL time, template render time and view time for each
+    request, reports them in a Server-Timing header and a structured log line,
+    and logs the SQL of requests slower than REQUEST_TIMING_SLOW_MS.
+
+    With REQUEST_TIMING off the middleware removes itself from the stack at
+    startup, so it can stay installed in production at no cost.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        request._timing_view_start = None
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        end = time.perf_counter()
+        total = end - start
+        view = end - request._timing_view_start if request._timing_view_start else 0.0
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={stats.sql_time * 1000:.1f};desc="{len(stats.queries)} queries"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'view;dur={view * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        route = request.resolver_match.view_name if request.resolver_match else None
+        timing_logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            'queries': len(stats.queries),
+            'sql_ms': round(stats.sql_time * 1000, 1),
+            'template_ms': round(stats.template_time * 1000, 1),
+            'view_ms': round(view * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }))
+        if total * 1000 >= settings.REQUEST_TIMING_SLOW_MS:
+            timing_logger.warning(
+                'Slow request %s %s (%.1f ms, %d queries):\n%s',
+                request.method, request.path, total * 1000, len(stats.queries),
+                '\n'.join(f'[{duration * 1000:.1f} ms] {sql}' for sql, duration in stats.queries),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing_view_start = time.perf_counter()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets GET and HEAD requests to the views in REPLICA_VIEWS read from the
+    replicas (see routers.ReplicaRouter). A request that writes sets a cookie
+    that keeps that client's reads on the primary for REPLICA_PIN_SECONDS, so
+    nobody misses their own bid or comment because a replica is behind.
+
+    Removes itself at startup when no replicas are configured.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = RequestRouting()
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if routing.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE_NAME, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = current_routing.get()
+        routing.read_replica = (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.url_name in settings.REPLICA_VIEWS
+            and settings.REPLICA_PIN_COOKIE_NAME not in request.COOKIES
+        )
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0009_comment"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-timestamp", "-id"],
+                name="listing_active_feed_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:04
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def populate_bid_aggregates(apps, schema_editor):
+    Bid = apps.get_model("auctions", "Bid")
+    Listing = apps.get_model("auctions", "Listing")
+    bids = Bid.objects.filter(listing=OuterRef("pk"))
+    Listing.objects.update(
+        bid_count=Coalesce(
+            Subquery(bids.values("listing").annotate(n=Count("id")).values("n")), 0
+        ),
+        highest_bid=Subquery(bids.order_by("-amount", "id").values("pk")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0010_listing_active_feed_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="bid_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="highest_bid",
+            field=models.ForeignKey(
+                blank=True,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="auctions.bid",
+            ),
+        ),
+        migrations.RunPython(populate_bid_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Full-text search over listing titles and descriptions (SQLite FTS5).
+
+from django.db import migrations
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE auctions_listing_fts USING fts5(
+        title, description, tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER auctions_listing_fts_insert AFTER INSERT ON auctions_listing
+    BEGIN
+        INSERT INTO auctions_listing_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER auctions_listing_fts_update
+    AFTER UPDATE OF title, description ON auctions_listing
+    BEGIN
+        DELETE FROM auctions_listing_fts WHERE rowid = old.id;
+        INSERT INTO auctions_listing_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER auctions_listing_fts_delete AFTER DELETE ON auctions_listing
+    BEGIN
+        DELETE FROM auctions_listing_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_insert",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_update",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_delete",
+    "DROP TABLE IF EXISTS auctions_listing_fts",
+]
+
+# Migrations that make SQLite rebuild auctions_listing (as adding some columns
+# does) lose the table's triggers, so they run this afterwards to create them
+# again, and before reversing, in case removing the column rebuilds it too.
+REINSTALL_TRIGGERS_SQL = DROP_SQL[:3] + CREATE_SQL[1:]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0011_listing_bid_aggregates"),
+    ]
+
+    # Existing listings are indexed by `manage.py rebuild_search_index`; the
+    # triggers keep the index current for every write after that.
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
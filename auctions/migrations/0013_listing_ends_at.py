@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0012_listing_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="ends_at",
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["ends_at"],
+                name="listing_active_ends_at_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:24
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module("auctions.migrations.0012_listing_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0013_listing_ends_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop,
+            search_index.run_on_sqlite(search_index.REINSTALL_TRIGGERS_SQL),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(
+            search_index.run_on_sqlite(search_index.REINSTALL_TRIGGERS_SQL),
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0014_listing_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["category", "-timestamp", "-id"],
+                name="listing_active_category_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:31
+
+import auctions.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0015_listing_active_category_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProxyBid",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "max_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=10,
+                        validators=[auctions.models.validate_price],
+                    ),
+                ),
+                ("timestamp", models.DateTimeField(auto_now_add=True)),
+                (
+                    "bidder",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="proxy_bids",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "listing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="proxy_bids",
+                        to="auctions.listing",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["listing", "-max_amount", "timestamp"],
+                        name="proxybid_listing_max_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="proxybid",
+            constraint=models.UniqueConstraint(
+                fields=("listing", "bidder"), name="proxybid_listing_bidder_unique"
+            ),
+        ),
+    ]
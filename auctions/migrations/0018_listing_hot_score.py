@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:51
+
+import math
+from importlib import import_module
+
+import auctions.models
+from django.conf import settings
+from django.db import migrations, models
+
+search_index = import_module("auctions.migrations.0012_listing_search_index")
+
+
+def seed_hot_scores(apps, schema_editor):
+    # Existing listings score their creation, plus their bids as if those all
+    # came in when the listing was last updated; bids don't record their time.
+    Listing = apps.get_model("auctions", "Listing")
+    listings = []
+    for listing in Listing.objects.only(
+        "timestamp", "updated_at", "bid_count"
+    ).iterator():
+        score = auctions.models.hot_points(
+            settings.HOT_WEIGHTS["listing"], listing.timestamp
+        )
+        if listing.bid_count:
+            bids = auctions.models.hot_points(
+                settings.HOT_WEIGHTS["bid"] * listing.bid_count, listing.updated_at
+            )
+            score = max(score, bids) + math.log1p(math.exp(-abs(score - bids)))
+        listing.hot_score = score
+        listings.append(listing)
+    Listing.objects.bulk_update(listings, ["hot_score"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0017_notification"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop,
+            search_index.run_on_sqlite(search_index.REINSTALL_TRIGGERS_SQL),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="hot_score",
+            field=models.FloatField(default=auctions.models.initial_hot_score),
+        ),
+        migrations.RunPython(
+            search_index.run_on_sqlite(search_index.REINSTALL_TRIGGERS_SQL),
+            migrations.RunPython.noop,
+        ),
+        migrations.RunPython(seed_hot_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-hot_score", "-id"],
+                name="listing_active_hot_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["category", "-hot_score", "-id"],
+                name="listing_active_cat_hot_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0019_archive"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("is_active", False)),
+                fields=["-updated_at"],
+                name="listing_closed_updated_idx",
+            ),
+        ),
+    ]
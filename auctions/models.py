@@ -1,6 +1,13 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Abs, Coalesce, Exp, Greatest, Ln
 from django.forms import ValidationError
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -11,6 +18,87 @@ def validate_price(value):
     if value < 0:
         raise ValidationError('Price must be positive') 
 
+def validate_end_time(value):
+    # For new listings only (the Create Listing form and the importer); an
+    # auction that has ended still has a valid ends_at.
+    if value is not None and value <= timezone.now():
+        raise ValidationError('The end time must be in the future.')
+
+# Hot scores count time from here, which keeps them small numbers.
+HOT_EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+def hot_points(weight, at=None):
+    """
+    The hot score of one event of `weight` at `at` (default now). Instead of
+    decaying every listing's score as time passes, each event counts for twice
+    as much as one HOT_HALF_LIFE seconds older, which ranks listings the same
+    way without ever rewriting old scores. Scores are natural logs, so they
+    never overflow.
+    """
+    at = at or timezone.now()
+    return math.log(weight) + (at - HOT_EPOCH).total_seconds() * math.log(2) / settings.HOT_HALF_LIFE
+
+def add_hot_points(weight):
+    # hot_score plus an event of `weight` now, for update(): log(e^hot_score + e^points).
+    points = Value(hot_points(weight))
+    return Greatest(F('hot_score'), points) + Ln(1 + Exp(-Abs(F('hot_score') - points)))
+
+def initial_hot_score():
+    return hot_points(settings.HOT_WEIGHTS['listing'])
+
+class ListingQuerySet(models.QuerySet):
+    # The columns the listing cards in index.html, category.html and friends display.
+    CARD_FIELDS = ['id', 'timestamp', 'title', 'description', 'price', 'image_url']
+
+    def active(self):
+        return self.filter(is_active=True)
+
+    def cards(self):
+        return self.only(*self.CARD_FIELDS)
+
+    def with_related(self):
+        # Everything the listing page shows about a listing, in one query.
+        return self.select_related('owner', 'winner', 'highest_bid')
+
+    def with_watching(self, user):
+        watches = Listing.watchers.through.objects.filter(listing=OuterRef('pk'), user=user)
+        return self.annotate(is_watching=Exists(watches))
+
+    def with_max_bid(self, user):
+        max_bids = ProxyBid.objects.filter(listing=OuterRef('pk'), bidder=user)
+        return self.annotate(max_bid=Subquery(max_bids.values('max_amount')[:1]))
+
+    def fingerprint(self):
+        # Changes whenever a listing joins, leaves or is modified within the set.
+        return self.aggregate(count=Count('id'), ids=Sum('id'), updated_at=Max('updated_at'))
+
+    def open_for_bids(self):
+        # Active and not past its end time, even if the closer hasn't got to it yet.
+        return self.active().filter(models.Q(ends_at__isnull=True) | models.Q(ends_at__gt=timezone.now()))
+
+    def expired(self):
+        return self.active().filter(ends_at__lte=timezone.now())
+
+    def close(self, closed_at):
+        # Closes the active listings in the set with one UPDATE, making each
+        # highest bidder the winner, and returns how many it closed. Listings
+        # it closed carry `closed_at` as their updated_at.
+        return self.active().update(
+            is_active=False,
+            winner=Subquery(Bid.objects.filter(pk=OuterRef('highest_bid')).values('bidder')[:1]),
+            updated_at=closed_at,
+        )
+
+    def rebuild_bid_aggregates(self):
+        # Recomputes the denormalized bid_count and highest_bid from the Bid table.
+        # Archived listings' bids aren't in it any more, so they keep their summary.
+        bids = Bid.objects.filter(listing=OuterRef('pk'))
+        return self.filter(archived_at__isnull=True).update(
+            bid_count=Coalesce(Subquery(bids.values('listing').annotate(n=Count('id')).values('n')), 0),
+            highest_bid=Subquery(bids.order_by('-amount', 'id').values('pk')[:1]),
+            updated_at=timezone.now(),
+        )
+
 class Listing(models.Model):
     id = models.AutoField(primary_key=True)
     timestamp = models.DateTimeField(auto_now_add=True) # Holds the timestamp for the listing's creation
@@ -29,6 +117,45 @@ class Listing(models.Model):
     is_active = models.BooleanField(default=True, auto_created=True)
     watchers = models.ManyToManyField(User, related_name='watchlist', blank=True, default=None, auto_created=True)
     winner = models.ForeignKey(User, on_delete=models.SET_DEFAULT, null=True, blank=True, default=None, related_name='listings_won')
+    # When the auction closes by itself; see `manage.py run_auction_closer`.
+    ends_at = models.DateTimeField(null=True, blank=True, default=None)
+    # Denormalized from the listing's bids, kept in sync by Bid.save().
+    bid_count = models.PositiveIntegerField(default=0)
+    highest_bid = models.ForeignKey('Bid', on_delete=models.SET_NULL, null=True, blank=True, default=None, related_name='+')
+    # Bumped by anything that changes the listing page: the listing itself, its bids and
+    # its comments. Queryset update()s skip auto_now, so those must set it themselves.
+    updated_at = models.DateTimeField(auto_now=True)
+    # Time-decayed activity, added to by each bid, new watcher and comment; see hot_points().
+    hot_score = models.FloatField(default=initial_hot_score)
+    # Set once `manage.py archive_auctions` has moved the closed auction's bids and
+    # comments to ArchivedBid and ArchivedComment. price, winner and bid_count
+    # still summarize them; highest_bid is cleared.
+    archived_at = models.DateTimeField(null=True, blank=True, default=None)
+
+    objects = ListingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves the keyset-paginated active listings feed on the index page. Django renders
+            # `is_active=True` as a bare `WHERE is_active`, which SQLite won't match against a
+            # leading boolean index column, so the flag is the index's condition instead.
+            models.Index(fields=['-timestamp', '-id'], condition=models.Q(is_active=True), name='listing_active_feed_idx'),
+            # The same feed per category, for the paginated category pages.
+            models.Index(
+                fields=['category', '-timestamp', '-id'], condition=models.Q(is_active=True),
+                name='listing_active_category_idx',
+            ),
+            # The trending section and the sort=hot feeds, overall and per category.
+            models.Index(fields=['-hot_score', '-id'], condition=models.Q(is_active=True), name='listing_active_hot_idx'),
+            models.Index(
+                fields=['category', '-hot_score', '-id'], condition=models.Q(is_active=True),
+                name='listing_active_cat_hot_idx',
+            ),
+            # Lets the auction closer find expired auctions without scanning closed ones.
+            models.Index(fields=['ends_at'], condition=models.Q(is_active=True), name='listing_active_ends_at_idx'),
+            # The latest close, which keys the cached category counts, and archive_auctions' scan.
+            models.Index(fields=['-updated_at'], condition=models.Q(is_active=False), name='listing_closed_updated_idx'),
+        ]
 
 class Bid(models.Model):
     id = models.AutoField(primary_key=True)
@@ -36,9 +163,94 @@ class Bid(models.Model):
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='bids')
     bidder = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bids')
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if adding:
+                # Ties go to the earlier bid, so only a strictly higher amount takes the lead.
+                outbid = ~Exists(Bid.objects.filter(pk=OuterRef('highest_bid'), amount__gte=self.amount))
+                Listing.objects.filter(pk=self.listing_id).update(
+                    bid_count=F('bid_count') + 1,
+                    highest_bid=models.Case(
+                        models.When(outbid, then=Value(self.pk)),
+                        default=F('highest_bid'),
+                        output_field=models.IntegerField(),
+                    ),
+                    updated_at=timezone.now(),
+                    hot_score=add_hot_points(settings.HOT_WEIGHTS['bid']),
+                )
+
+class ProxyBid(models.Model):
+    # A bidder's maximum bid on a listing. bidding.place_bid() and place_max_bid()
+    # bid on the bidder's behalf up to it, writing only the Bid rows that matter.
+    id = models.AutoField(primary_key=True)
+    max_amount = models.DecimalField(decimal_places=2, max_digits=10, validators=[validate_price])
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='proxy_bids')
+    bidder = models.ForeignKey(User, on_delete=models.CASCADE, related_name='proxy_bids')
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'bidder'], name='proxybid_listing_bidder_unique'),
+        ]
+        indexes = [
+            # The two highest maximums above a price, in the order they compete in.
+            models.Index(fields=['listing', '-max_amount', 'timestamp'], name='proxybid_listing_max_idx'),
+        ]
+
+class ArchivedBid(models.Model):
+    # A Bid of a long-closed auction, moved out of the live table by
+    # `manage.py archive_auctions`. Keeps the bid's original id.
+    id = models.IntegerField(primary_key=True)
+    amount = models.DecimalField(decimal_places=2, max_digits=10)
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='archived_bids')
+    bidder = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bids')
+
+class CommentQuerySet(models.QuerySet):
+    def for_display(self):
+        return self.select_related('author').order_by('timestamp')
+
 class Comment(models.Model):
     id = models.AutoField(primary_key=True)
     content = models.CharField(max_length=500)
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
-    timestamp = models.DateTimeField(auto_now_add=True) # Holds the timestamp for the listing's creation
\ No newline at end of file
+    timestamp = models.DateTimeField(auto_now_add=True) # Holds the timestamp for the listing's creation
+
+    objects = CommentQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Listing.objects.filter(pk=self.listing_id).update(
+                updated_at=timezone.now(), hot_score=add_hot_points(settings.HOT_WEIGHTS['comment']),
+            )
+
+class ArchivedComment(models.Model):
+    # A Comment of a long-closed auction; see ArchivedBid.
+    id = models.IntegerField(primary_key=True)
+    content = models.CharField(max_length=500)
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='archived_comments')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_comments')
+    timestamp = models.DateTimeField()
+
+    objects = CommentQuerySet.as_manager()
+
+class Notification(models.Model):
+    # Outbox of emails to users, written in the same transaction as the bid or close
+    # they're about and sent later by `manage.py dispatch_notifications`, which
+    # deletes them once delivered.
+    OUTBID = 'outbid'
+    WON = 'won'
+    KINDS = [
+        (OUTBID, 'Outbid'),
+        (WON, 'Won'),
+    ]
+    id = models.AutoField(primary_key=True)
+    kind = models.CharField(max_length=8, choices=KINDS)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='notifications')
+    # The price that outbid the recipient, or the winning price.
+    amount = models.DecimalField(decimal_places=2, max_digits=10)
+    timestamp = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,62 @@
+import base64
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, count):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != count:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def keyset_page(queryset, cursor, ordering, size):
+    """
+    Returns one page of `queryset` ordered by `ordering` (e.g. ('-timestamp', '-id'))
+    together with the cursor of the next page, or None on the last page.
+
+    Rather than OFFSET, the page starts strictly after the row the cursor was
+    taken from, so every page is a single index range scan however deep it is.
+    """
+    names = [key.lstrip('-') for key in ordering]
+    if cursor:
+        model = queryset.model
+        raw_values = decode_cursor(cursor, len(names))
+        try:
+            values = [model._meta.get_field(name).to_python(value) for name, value in zip(names, raw_values)]
+        except Exception:
+            raise InvalidCursor(cursor)
+        after = Q()
+        for i, key in enumerate(ordering):
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            condition = Q(**{f'{names[i]}__{lookup}': values[i]})
+            for name, value in zip(names[:i], values[:i]):
+                condition &= Q(**{name: value})
+            after |= condition
+        queryset = queryset.filter(after)
+    rows = list(queryset.order_by(*ordering)[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    last = rows[-1]
+    return rows, encode_cursor(_row_value(last, name) for name in names)
+
+
+def _row_value(row, name):
+    if isinstance(row, dict):
+        return row[name]
+    return getattr(row, name)
@@ -0,0 +1,67 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Set by ReplicaRoutingMiddleware for the duration of each request.
+current_routing = ContextVar('current_routing', default=None)
+
+
+class RequestRouting:
+    def __init__(self):
+        # Whether this request's reads may go to a replica.
+        self.read_replica = False
+        # Whether this request has written anything, which pins the client to the primary.
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """
+    Sends reads of the auctions app's models to a random one of
+    REPLICA_DATABASES while ReplicaRoutingMiddleware allows it, and everything
+    else to the primary. The user model lives in this app too but always reads
+    from the primary, as do other apps (sessions, auth), so a lagging replica
+    never signs someone in with a stale password or account.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if (
+            routing and routing.read_replica and settings.REPLICA_DATABASES
+            and model._meta.app_label == 'auctions' and model._meta.label != settings.AUTH_USER_MODEL
+        ):
+            return random.choice(settings.REPLICA_DATABASES)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing:
+            routing.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so objects from any of them can be related.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+@contextmanager
+def primary_reads():
+    """
+    Reads inside the block go to the primary. For anything cached under a key
+    that a write has just changed, a lagging replica would fill the new key
+    with old data.
+    """
+    routing = current_routing.get()
+    if routing is None:
+        yield
+        return
+    read_replica = routing.read_replica
+    routing.read_replica = False
+    try:
+        yield
+    finally:
+        routing.read_replica = read_replica
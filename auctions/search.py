@@ -0,0 +1,52 @@
+import re
+
+from django.db import connections, router
+
+from .models import Listing
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# Listing titles and descriptions are mirrored into this FTS5 table by the
+# triggers created in migration 0012 (and by `manage.py rebuild_search_index`).
+# SQLite drops those triggers whenever a migration rebuilds auctions_listing,
+# so such migrations must create them again; see migration 0014.
+SEARCH_TABLE = 'auctions_listing_fts'
+
+
+def match_expression(query):
+    # Quote every word so user input can never be parsed as FTS5 query syntax.
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query))
+
+
+def search_listing_ids(query, cursor, size):
+    """
+    Returns the ids of one page of active listings matching `query`, best
+    match first, and the cursor of the next page (None on the last page).
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    sql = f'''
+        SELECT fts.rowid, fts.rank
+        FROM {SEARCH_TABLE} AS fts
+        JOIN auctions_listing AS listing ON listing.id = fts.rowid
+        WHERE fts.{SEARCH_TABLE} MATCH %s AND listing.is_active
+    '''
+    params = [expression]
+    if cursor:
+        rank, listing_id = decode_cursor(cursor, 2)
+        try:
+            rank, listing_id = float(rank), int(listing_id)
+        except ValueError:
+            raise InvalidCursor(cursor)
+        sql += ' AND (fts.rank > %s OR (fts.rank = %s AND fts.rowid > %s))'
+        params += [rank, rank, listing_id]
+    sql += ' ORDER BY fts.rank, fts.rowid LIMIT %s'
+    params.append(size + 1)
+    with connections[router.db_for_read(Listing)].cursor() as c:
+        c.execute(sql, params)
+        rows = c.fetchall()
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor([rows[-1][1], rows[-1][0]])
+    return [listing_id for listing_id, _ in rows], next_cursor
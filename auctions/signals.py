@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import user_cache_key
+from .caching import invalidate_category_counts
+from .events import publish_listing_state
+from .models import Bid, Listing, User
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_save, sender=Bid)
+def listing_changed(sender, instance, **kwargs):
+    listing_id = instance.pk if sender is Listing else instance.listing_id
+    transaction.on_commit(lambda: publish_listing_state(listing_id))
+
+
+@receiver(post_delete, sender=Listing)
+def listing_deleted(sender, instance, **kwargs):
+    # New and closed listings change the category counts' cache key by
+    # themselves; a deleted one doesn't.
+    transaction.on_commit(invalidate_category_counts)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: cache.delete(user_cache_key(instance.pk)))
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    # Applies the SQLITE_PRAGMAS of the selected database profile to every new connection.
+    if connection.vendor == 'sqlite' and settings.SQLITE_PRAGMAS:
+        with connection.cursor() as cursor:
+            for name, value in settings.SQLITE_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
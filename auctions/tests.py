@@ -1,3 +1,454 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from auctions import assets, bidding
+from auctions.bidding import ACCEPTED, CLOSED, OUTBID, place_bid, place_bids, place_max_bid
+from auctions.caching import category_counts
+from auctions.management.commands.archive_auctions import archive_closed_auctions
+from auctions.management.commands.run_auction_closer import close_expired_auctions
+from auctions.models import ArchivedComment, Bid, Comment, Listing, Notification, ProxyBid, User
+from auctions.routers import ReplicaRouter, RequestRouting, current_routing
+
+
+class OutbidNotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'password')
+        self.listing = Listing.objects.create(title='Helmet', description='', price=1, owner=owner)
+
+    def outbids(self):
+        return list(
+            Notification.objects.filter(kind=Notification.OUTBID)
+            .order_by('id').values_list('recipient__username', 'amount')
+        )
+
+    def test_outbid_leader_is_notified(self):
+        place_bid(self.listing.pk, self.alice, Decimal(5))
+        place_bid(self.listing.pk, self.bob, Decimal(6))
+        self.assertEqual(self.outbids(), [('alice', Decimal(6))])
+
+    def test_raising_own_bid_does_not_notify(self):
+        place_bid(self.listing.pk, self.alice, Decimal(5))
+        place_bid(self.listing.pk, self.alice, Decimal(6))
+        self.assertEqual(self.outbids(), [])
+
+    def test_bid_beaten_by_proxy_does_not_notify_the_proxy_holder(self):
+        place_max_bid(self.listing.pk, self.alice, Decimal(100))
+        place_bid(self.listing.pk, self.bob, Decimal(50))
+        # Bob led for an instant between his bid and Alice's proxy answering it.
+        self.assertEqual(self.outbids(), [])
+
+    def test_proxy_contest_notifies_only_the_leader_who_lost(self):
+        place_bid(self.listing.pk, self.alice, Decimal(40))
+        place_max_bid(self.listing.pk, self.alice, Decimal(100))
+        place_bid(self.listing.pk, self.bob, Decimal(50))
+        self.assertEqual(self.outbids(), [])
+        place_max_bid(self.listing.pk, self.bob, Decimal(200))
+        self.assertEqual(self.outbids(), [('alice', Decimal(101))])
+        place_max_bid(self.listing.pk, self.alice, Decimal(150))
+        # Bob's maximum answers Alice's and he still leads, so nobody new was outbid.
+        self.assertEqual(self.outbids(), [('alice', Decimal(101))])
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.highest_bid.bidder, self.bob)
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        routing = RequestRouting()
+        routing.read_replica = True
+        token = current_routing.set(routing)
+        self.addCleanup(current_routing.reset, token)
+
+    def test_listings_read_from_a_replica(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Listing), 'replica')
+
+    def test_users_always_read_from_the_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_read(User), 'default')
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.listing = Listing.objects.create(title='Helmet', description='', price=1, owner=self.owner)
+        Comment.objects.create(listing=self.listing, author=self.owner, content='Still boxed.')
+        Listing.objects.filter(pk=self.listing.pk).update(is_active=False, updated_at=timezone.now() - timedelta(days=60))
+
+    def test_archiving_moves_comments_and_marks_the_listing_updated(self):
+        self.assertEqual(archive_closed_auctions(timedelta(days=30), 10), [self.listing.pk])
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.updated_at, self.listing.archived_at)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(ArchivedComment.objects.get().content, 'Still boxed.')
+
+    def test_archiving_deletes_maximum_bids(self):
+        ProxyBid.objects.create(listing=self.listing, bidder=self.owner, max_amount=50)
+        archive_closed_auctions(timedelta(days=30), 10)
+        self.assertFalse(ProxyBid.objects.exists())
+
+    def test_watching_a_closed_listing_does_not_delay_archiving(self):
+        self.client.force_login(self.owner)
+        self.client.get(f'/watchlist/add/{self.listing.pk}')
+        self.assertTrue(self.owner.watchlist.filter(pk=self.listing.pk).exists())
+        self.assertEqual(archive_closed_auctions(timedelta(days=30), 10), [self.listing.pk])
+
+    def test_archived_listing_is_not_archived_again(self):
+        archive_closed_auctions(timedelta(days=30), 10)
+        self.assertEqual(archive_closed_auctions(timedelta(days=30), 10), [])
+        self.assertEqual(ArchivedComment.objects.count(), 1)
+
+    def test_comment_on_archived_listing_is_refused(self):
+        archive_closed_auctions(timedelta(days=30), 10)
+        self.client.force_login(self.owner)
+        response = self.client.post(f'/listing/{self.listing.pk}', {'type': 'comment', 'content': 'Sold?'})
+        self.assertContains(response, 'This auction has been archived and no longer takes comments.')
+        self.assertFalse(Comment.objects.exists())
+
+
+class StaticEncodingTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        for name in ['site.css', 'site.css.gz', 'site.css.br']:
+            with open(f'{root.name}/{name}', 'w') as f:
+                f.write(name)
+        static_root = override_settings(STATIC_ROOT=root.name)
+        static_root.enable()
+        self.addCleanup(static_root.disable)
+
+    def encoding(self, accept_encoding):
+        request = RequestFactory().get('/static/site.css', HTTP_ACCEPT_ENCODING=accept_encoding)
+        response = assets.serve(request, 'site.css')
+        response.close()
+        return response.headers.get('Content-Encoding')
+
+    def test_prefers_brotli(self):
+        self.assertEqual(self.encoding('gzip, deflate, br'), 'br')
+
+    def test_honours_q_values(self):
+        self.assertEqual(self.encoding('br;q=0, gzip'), 'gzip')
+        self.assertEqual(self.encoding('br;q=0.5, gzip;q=0.8'), 'gzip')
+        self.assertEqual(self.encoding('*;q=0'), None)
+        self.assertEqual(self.encoding('gzip;q=0, *'), 'br')
+
+    def test_tokens_are_matched_whole(self):
+        self.assertEqual(self.encoding('x-gzip'), None)
+
+
+class ListingSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.listing = Listing.objects.create(title='Helmet', description='', price=1, owner=owner)
+        self.client.force_login(User.objects.create_user('alice', 'alice@example.com', 'password'))
+
+    def test_write_without_signals_is_seen(self):
+        # As from another process, whose cache invalidation this one never sees.
+        self.assertContains(self.client.get(f'/listing/{self.listing.pk}'), 'Place bid')
+        Listing.objects.filter(pk=self.listing.pk).update(is_active=False, updated_at=timezone.now())
+        self.assertNotContains(self.client.get(f'/listing/{self.listing.pk}'), 'Place bid')
+
+
+class CategoryCountsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.listing = Listing.objects.create(title='Helmet', description='', price=1, owner=self.owner, category='TOY')
+
+    def test_counts_follow_writes_from_other_processes(self):
+        self.assertEqual(category_counts(), {'TOY': 1})
+        # Queryset writes send no signals, like the closer and the importer in their own processes.
+        Listing.objects.filter(pk=self.listing.pk).update(is_active=False, updated_at=timezone.now())
+        self.assertEqual(category_counts(), {})
+        Listing.objects.bulk_create([Listing(title='Drill', description='', price=1, owner=self.owner, category='TOO')])
+        self.assertEqual(category_counts(), {'TOO': 1})
+
+    def test_deleting_a_listing_updates_the_counts(self):
+        Listing.objects.create(title='Drill', description='', price=1, owner=self.owner, category='TOY')
+        self.assertEqual(category_counts(), {'TOY': 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.delete()
+        self.assertEqual(category_counts(), {'TOY': 1})
+
+
+class CloseAuctionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.listing = Listing.objects.create(title='Helmet', description='', price=1, owner=self.owner)
+        place_bid(self.listing.pk, self.alice, Decimal(5))
+        self.client.force_login(self.owner)
+
+    def close(self):
+        return self.client.post(f'/listing/{self.listing.pk}', {'type': 'close_auction'})
+
+    def wins(self):
+        return list(Notification.objects.filter(kind=Notification.WON).values_list('recipient__username', 'amount'))
+
+    def test_closing_makes_the_highest_bidder_the_winner(self):
+        self.assertContains(self.close(), 'The winner is <strong>alice.')
+        self.assertEqual(self.wins(), [('alice', Decimal(5))])
+
+    def test_closing_twice_notifies_once(self):
+        self.close()
+        self.close()
+        self.assertEqual(self.wins(), [('alice', Decimal(5))])
+
+    def test_closing_after_the_closer_notifies_once(self):
+        Listing.objects.filter(pk=self.listing.pk).update(ends_at=timezone.now())
+        close_expired_auctions(10)
+        self.close()
+        self.assertEqual(self.wins(), [('alice', Decimal(5))])
+
+
+@override_settings(BID_INCREMENT=Decimal(1))
+class MaxBidTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'password')
+        self.listing = Listing.objects.create(title='Helmet', description='', price=1, owner=owner)
+
+    def leader(self):
+        self.listing.refresh_from_db()
+        return self.listing.highest_bid.bidder.username, self.listing.price
+
+    def test_maximums_settle_one_increment_over_the_runner_up(self):
+        place_max_bid(self.listing.pk, self.alice, Decimal(50))
+        result = place_max_bid(self.listing.pk, self.bob, Decimal(80))
+        self.assertEqual((result.status, result.price), (ACCEPTED, Decimal(51)))
+        self.assertEqual(self.leader(), ('bob', Decimal(51)))
+
+    def test_settling_price_is_capped_at_the_top_maximum(self):
+        place_max_bid(self.listing.pk, self.alice, Decimal(50))
+        place_max_bid(self.listing.pk, self.bob, Decimal('50.50'))
+        self.assertEqual(self.leader(), ('bob', Decimal('50.50')))
+
+    def test_equal_maximums_go_to_the_one_set_first(self):
+        place_max_bid(self.listing.pk, self.alice, Decimal(50))
+        result = place_max_bid(self.listing.pk, self.bob, Decimal(50))
+        self.assertEqual((result.status, result.price), (OUTBID, Decimal(50)))
+        self.assertEqual(self.leader(), ('alice', Decimal(50)))
+
+    def test_bid_equal_to_an_earlier_maximum_is_outbid(self):
+        place_max_bid(self.listing.pk, self.alice, Decimal(100))
+        result = place_bid(self.listing.pk, self.bob, Decimal(100))
+        self.assertEqual((result.status, result.price), (OUTBID, Decimal(100)))
+        self.assertEqual(self.leader(), ('alice', Decimal(100)))
+        self.assertEqual(list(Notification.objects.values_list('recipient__username', flat=True)), [])
+
+    def test_bid_below_a_maximum_is_answered(self):
+        place_max_bid(self.listing.pk, self.alice, Decimal(100))
+        result = place_bid(self.listing.pk, self.bob, Decimal(60))
+        self.assertEqual((result.status, result.price), (OUTBID, Decimal(61)))
+        self.assertEqual(self.leader(), ('alice', Decimal(61)))
+
+
+class PlaceBidTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.listing = Listing.objects.create(title='Helmet', description='', price=10, owner=owner)
+        self.ended = Listing.objects.create(
+            title='Drill', description='', price=10, owner=owner, ends_at=timezone.now() - timedelta(seconds=1),
+        )
+
+    def test_higher_bid_is_accepted(self):
+        result = place_bid(self.listing.pk, self.alice, Decimal(11))
+        self.assertEqual((result.status, result.price, result.bid.amount), (ACCEPTED, Decimal(11), Decimal(11)))
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.price, self.listing.bid_count), (Decimal(11), 1))
+
+    def test_lower_or_equal_bid_is_rejected(self):
+        for amount in [Decimal(9), Decimal(10)]:
+            result = place_bid(self.listing.pk, self.alice, amount)
+            self.assertEqual((result.status, result.price, result.bid), (OUTBID, Decimal(10), None))
+        self.assertFalse(Bid.objects.exists())
+
+    def test_bid_after_the_end_time_is_closed(self):
+        # The closer hasn't run yet, so the listing is still marked active.
+        result = place_bid(self.ended.pk, self.alice, Decimal(11))
+        self.assertEqual(result.status, CLOSED)
+        self.assertFalse(Bid.objects.exists())
+
+    def test_batch_returns_a_result_per_bid(self):
+        results = place_bids(self.alice, [
+            (self.listing.pk, Decimal(11)),
+            (self.listing.pk, Decimal(11)),
+            (self.ended.pk, Decimal(20)),
+            (self.listing.pk, Decimal(12)),
+        ])
+        self.assertEqual(
+            [(result.status, result.price) for result in results],
+            [(ACCEPTED, Decimal(11)), (OUTBID, Decimal(11)), (CLOSED, Decimal(10)), (ACCEPTED, Decimal(12))],
+        )
+
+    @override_settings(BID_BUSY_RETRIES=2, BID_BUSY_BACKOFF=0)
+    def test_busy_database_is_retried(self):
+        attempts = []
+
+        def locked_once(*args):
+            attempts.append(args)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return place(*args)
+
+        place = bidding._place_bid
+        with mock.patch.object(bidding, '_place_bid', locked_once):
+            result = place_bid(self.listing.pk, self.alice, Decimal(11))
+        self.assertEqual((len(attempts), result.status), (2, ACCEPTED))
+
+    @override_settings(BID_BUSY_RETRIES=1, BID_BUSY_BACKOFF=0)
+    def test_other_errors_are_not_retried(self):
+        with mock.patch.object(bidding, '_place_bid', side_effect=OperationalError('no such table')) as placed:
+            with self.assertRaises(OperationalError):
+                place_bid(self.listing.pk, self.alice, Decimal(11))
+        self.assertEqual(placed.call_count, 1)
+
+
+@override_settings(LISTINGS_PAGE_SIZE=2)
+class CategoryPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.listings = [
+            Listing.objects.create(title=f'Toy {i}', description='', price=1, owner=self.owner, category='TOY')
+            for i in range(3)
+        ]
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return lambda: self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_page_is_not_modified(self):
+        status = self.revalidate('/category/Toys')
+        with self.assertNumQueries(1):
+            self.assertEqual(status(), 304)
+
+    def test_change_on_the_page_is_modified(self):
+        status = self.revalidate('/category/Toys?sort=hot')
+        place_bid(self.listings[2].pk, User.objects.create_user('alice'), Decimal(5))
+        self.assertEqual(status(), 200)
+
+    def test_change_on_another_page_is_not_modified(self):
+        # The newest two are on the first page; the oldest is on the next.
+        status = self.revalidate('/category/Toys')
+        Comment.objects.create(listing=self.listings[0], author=self.owner, content='Boxed.')
+        self.assertEqual(status(), 304)
+
+    def test_new_listing_is_modified(self):
+        status = self.revalidate('/category/Toys')
+        Listing.objects.create(title='Toy 3', description='', price=1, owner=self.owner, category='TOY')
+        self.assertEqual(status(), 200)
+
+
+class ImportListingsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('owner', 'owner@example.com', 'password')
+        User.objects.create_user('alice', 'alice@example.com', 'password')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+
+    def write(self, name, rows):
+        with open(f'{self.path}/{name}', 'w') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+        return f'{self.path}/{name}'
+
+    def test_valid_rows_are_imported_and_invalid_ones_rejected(self):
+        listings = self.write('listings.jsonl', [
+            {'ref': 'a', 'title': 'Helmet', 'description': 'Red', 'price': '5', 'category': 'TOY', 'owner': 'owner'},
+            {'ref': 'b', 'title': 'Drill', 'description': 'Cordless', 'price': '5', 'ends_at': '2001-01-01T00:00:00Z'},
+            {'ref': 'c', 'title': 'Lamp', 'description': 'Brass', 'price': '-1'},
+            {'ref': 'd', 'title': 'Rug', 'description': 'Wool', 'price': '5', 'owner': 'nobody'},
+        ])
+        bids = self.write('bids.jsonl', [
+            {'listing': 'a', 'bidder': 'alice', 'amount': '8'},
+            {'listing': 'b', 'bidder': 'alice', 'amount': '8'},
+        ])
+        rejects = f'{self.path}/rejects.jsonl'
+        call_command(
+            'import_listings', listings, bids=bids, owner='owner', rejects=rejects,
+            stdout=io.StringIO(), stderr=io.StringIO(),
+        )
+        listing = Listing.objects.get()
+        self.assertEqual((listing.title, listing.price, listing.bid_count), ('Helmet', Decimal(8), 1))
+        with open(rejects) as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual(
+            [(row['file'].rsplit('/', 1)[1], row['row'], sorted(row['errors'])) for row in rejected],
+            [
+                ('listings.jsonl', 2, ['ends_at']),
+                ('listings.jsonl', 3, ['price']),
+                ('listings.jsonl', 4, ['owner']),
+                ('bids.jsonl', 2, ['listing']),
+            ],
+        )
+        self.assertEqual(rejected[0]['errors']['ends_at'], ['The end time must be in the future.'])
+
+
+@override_settings(LISTING_EVENTS_POLL_MS=60000)
+class ListingEventsTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.listing = Listing.objects.create(title='Helmet', description='', price=1, owner=owner)
+
+    def test_without_asgi_the_browser_polls_slowly(self):
+        response = self.client.get(f'/listing/{self.listing.pk}/events')
+        self.assertTrue(response.content.decode().startswith('retry: 60000\nevent: listing\n'))
+
+    def test_closed_listing_sends_its_state_once(self):
+        Listing.objects.filter(pk=self.listing.pk).update(is_active=False)
+        response = self.client.get(f'/listing/{self.listing.pk}/events')
+        self.assertIn('"is_active": false', response.content.decode())
+
+
+class ApiConditionalTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.listing = Listing.objects.create(title='Helmet', description='', price=1, owner=owner)
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'password')
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return lambda: self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_responses_cost_one_query(self):
+        for url in ['/api/v1/listings', f'/api/v1/listings/{self.listing.pk}', f'/api/v1/listings/{self.listing.pk}/bids']:
+            status = self.revalidate(url)
+            with self.assertNumQueries(1):
+                self.assertEqual(status(), 304)
+
+    def test_bid_changes_the_listing_and_its_bids(self):
+        listing, bids = (
+            self.revalidate(f'/api/v1/listings/{self.listing.pk}'),
+            self.revalidate(f'/api/v1/listings/{self.listing.pk}/bids'),
+        )
+        place_bid(self.listing.pk, self.alice, Decimal(5))
+        self.assertEqual((listing(), bids()), (200, 200))
+
+    def test_new_listing_changes_the_feed(self):
+        status = self.revalidate('/api/v1/listings')
+        Listing.objects.create(title='Drill', description='', price=1, owner=self.alice)
+        self.assertEqual(status(), 200)
+
+    def test_other_fields_have_their_own_etag(self):
+        url = f'/api/v1/listings/{self.listing.pk}'
+        self.assertNotEqual(self.client.get(url)['ETag'], self.client.get(url + '?fields=id')['ETag'])
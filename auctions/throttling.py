@@ -0,0 +1,48 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _bucket_key(scope, ident):
+    # Usernames can hold characters that aren't valid in every cache backend's keys.
+    return f'throttle:{scope}:{hashlib.md5(ident.encode()).hexdigest()}'
+
+
+def take_token(scope, ident):
+    """
+    Takes a token from the bucket for `ident` under `scope` in
+    AUTH_THROTTLE_RATES, where (capacity, period) means `capacity` attempts in a
+    burst, refilled evenly over `period` seconds. Returns 0 if a token was
+    taken, otherwise the number of seconds until the next one. Buckets live in
+    the default cache, so concurrent requests can occasionally both take the
+    last token; that's fine for shedding floods.
+    """
+    rate = settings.AUTH_THROTTLE_RATES.get(scope)
+    if rate is None:
+        return 0
+    capacity, period = rate
+    key = _bucket_key(scope, ident)
+    now = time.time()
+    tokens, updated = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) * capacity / period)
+    if tokens < 1:
+        return math.ceil((1 - tokens) * period / capacity)
+    # A bucket left alone for `period` seconds is full again, the same as no entry.
+    cache.set(key, (tokens - 1, now), period)
+    return 0
+
+
+def auth_attempt_wait(request, action, username):
+    """
+    Charges an attempt to `action` ('login' or 'register') against both the
+    client's IP address and the username. Returns how many seconds the client
+    must wait before trying again, or 0 if the attempt may go ahead.
+    """
+    ip_wait = take_token(f'{action}_ip', request.META.get('REMOTE_ADDR', ''))
+    if ip_wait:
+        # Don't drain the username's bucket with attempts that were refused anyway.
+        return ip_wait
+    return take_token(f'{action}_username', username.lower())
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
     path("", views.index, name="index"),
@@ -9,9 +9,17 @@ urlpatterns = [
     path("register", views.register, name="register"),
     path("sell", views.add_listing, name="add_listing"),
     path("listing/<int:listing_id>", views.listing, name="listing"),
+    path("listing/<int:listing_id>/events", views.listing_events, name="listing_events"),
+    path("search", views.search, name="search"),
     path("categories", views.categories, name="categories"),
     path("category/<str:category>", views.category, name="category"),
     path("watchlist", views.watchlist, name="watchlist"),
     path('watchlist/add/<int:listing_id>', views.watchlist_add, name="watchlist_add"),
     path('watchlist/remove/<int:listing_id>', views.watchlist_remove, name="watchlist_remove"),
+    path("dashboard", views.dashboard, name="dashboard"),
+    path("api/v1/listings", api.listings, name="api_listings"),
+    path("api/v1/listings/<int:listing_id>", api.listing, name="api_listing"),
+    path("api/v1/listings/<int:listing_id>/bids", api.listing_bids, name="api_listing_bids"),
+    path("api/v1/listings/<int:listing_id>/comments", api.listing_comments, name="api_listing_comments"),
+    path("api/v1/bids", api.bids, name="api_bids"),
 ]
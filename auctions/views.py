@@ -1,27 +1,86 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
-from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect, Http404, HttpResponseBadRequest 
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Window
+from django.http import HttpResponse, HttpResponseRedirect, Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django import forms 
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from .models import User, Listing, Bid, Comment
+from .bidding import CLOSED, OUTBID, place_bid, place_max_bid
+from .caching import category_counts, listing_snapshot_key
+from .conditional import conditional_page
+from .events import hub, listing_state, publish_listing_state
+from .models import User, Listing, Bid, Comment, Notification, ProxyBid, add_hot_points, validate_end_time
+from .pagination import InvalidCursor, keyset_page
+from .routers import primary_reads
+from .search import search_listing_ids
+from .throttling import auth_attempt_wait
+
+# Category display name (as used in category URLs) -> code.
+CATEGORY_CODES = {name: code for code, name in Listing.CATEGORIES}
+
+# ?sort= value -> ordering of the listing feeds. Each has a matching partial index.
+# Hot scores move as people bid, so a listing can shift between pages of sort=hot.
+LISTING_SORTS = {
+    'new': ('-timestamp', '-id'),
+    'hot': ('-hot_score', '-id'),
+}
 
 
 def index(request):
-    active_listings = Listing.objects.filter(is_active=True)
+    sort = request.GET.get('sort', 'new')
+    if sort not in LISTING_SORTS:
+        return HttpResponseBadRequest('Invalid sort')
+    active_listings = Listing.objects.active().cards()
+    try:
+        active_listings, next_cursor = keyset_page(
+            active_listings, request.GET.get('cursor'), LISTING_SORTS[sort], settings.LISTINGS_PAGE_SIZE
+        )
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    is_first_page = 'cursor' not in request.GET
+    trending = []
+    if is_first_page and sort != 'hot':
+        trending = (
+            Listing.objects.active().only('id', 'title', 'price')
+            .order_by(*LISTING_SORTS['hot'])[:settings.TRENDING_SIZE]
+        )
     return render(request, "auctions/index.html", {
-        'active_listings': active_listings
+        'active_listings': active_listings,
+        'trending': trending,
+        'sort': sort,
+        'next_cursor': next_cursor,
+        'is_first_page': is_first_page,
     })
 
 
+def too_many_attempts(request, template, retry_after):
+    response = render(request, template, {
+        "message": f"Too many attempts. Try again in {retry_after} seconds."
+    }, status=429)
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
 def login_view(request):
     if request.method == "POST":
 
         # Attempt to sign user in
         username = request.POST["username"]
         password = request.POST["password"]
+        retry_after = auth_attempt_wait(request, "login", username)
+        if retry_after:
+            return too_many_attempts(request, "auctions/login.html", retry_after)
         user = authenticate(request, username=username, password=password)
 
         # Check if authentication successful
@@ -54,6 +113,10 @@ def register(request):
                 "message": "Passwords must match."
             })
 
+        retry_after = auth_attempt_wait(request, "register", username)
+        if retry_after:
+            return too_many_attempts(request, "auctions/register.html", retry_after)
+
         # Attempt to create new user
         try:
             user = User.objects.create_user(username, email, password)
@@ -70,13 +133,19 @@ def register(request):
 class ListingForm(forms.ModelForm):
     class Meta:
         model = Listing
-        fields = ['title', 'description', 'price', 'image_url', 'category']
+        fields = ['title', 'description', 'price', 'image_url', 'category', 'ends_at']
         widgets = {
-            'description': forms.Textarea()
+            'description': forms.Textarea(),
+            'ends_at': forms.DateTimeInput({'type': 'datetime-local'}),
         }
         labels = {
-            'image_url': _('Image URL') 
+            'image_url': _('Image URL'),
+            'ends_at': _('Auction ends at (optional)'),
         }
+    def clean_ends_at(self):
+        ends_at = self.cleaned_data['ends_at']
+        validate_end_time(ends_at)
+        return ends_at
 def add_listing(request):
     if not request.user.is_authenticated:
         return HttpResponseRedirect(reverse('login'))
@@ -84,8 +153,9 @@ def add_listing(request):
     if request.method == 'POST':
         listing = Listing(owner=user)
         form = ListingForm(request.POST, instance=listing)
-        if form.is_valid:
-            form.save() 
+        if form.is_valid():
+            form.save()
+            return HttpResponseRedirect(reverse('listing', args=[listing.id]))
         else:
             return render(request, 'auctions/add_listing.html', {
                 'form': form
@@ -109,144 +179,340 @@ class BidForm(forms.ModelForm):
             'amount':   forms.NumberInput({'placeholder': 'Enter bid', 'class': 'bid-entry-box'})
         }
     def clean(self):
+        # A cheap early rejection only: the price may move before the bid is
+        # placed, so bidding.place_bid() makes the authoritative check.
         cleaned_data = super().clean()
-        amount = cleaned_data['amount']
-        print(amount)
-        if amount <= self.instance.listing.price:
-            print("value too small")
+        amount = cleaned_data.get('amount')
+        if amount is not None and amount <= self.instance.listing.price:
             self.add_error('amount', "Bid must be higher than the current price!")
+class MaxBidForm(forms.ModelForm):
+    class Meta:
+        model = ProxyBid
+        fields = ['max_amount']
+        widgets = {
+            'max_amount':   forms.NumberInput({'placeholder': 'Enter maximum bid', 'class': 'bid-entry-box'})
+        }
+    def __init__(self, *args, listing=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.listing = listing
+    def clean(self):
+        # Same early rejection as BidForm; bidding.place_max_bid() decides.
+        cleaned_data = super().clean()
+        max_amount = cleaned_data.get('max_amount')
+        if max_amount is not None and max_amount <= self.listing.price:
+            self.add_error('max_amount', "Maximum bid must be higher than the current price!")
 class CloseAuctionForm(forms.Form):
     pass
 
+def viewer_state(request, listing_id):
+    # The listing's modification time plus what the page shows only to this
+    # user, in one query. None if there is no such listing.
+    listings = Listing.objects.filter(pk=listing_id)
+    if request.user.is_authenticated:
+        listings = listings.with_watching(request.user).with_max_bid(request.user)
+        return listings.values('updated_at', 'is_watching', 'max_bid').first()
+    return listings.values('updated_at').first()
+
+def listing_validators(request, listing_id):
+    row = viewer_state(request, listing_id)
+    if row is None:
+        return None
+    # A GET that isn't answered with 304 renders from this same row.
+    request.listing_viewer_state = row
+    return (row['updated_at'], row.get('is_watching'), row.get('max_bid')), row['updated_at']
+
+@conditional_page(listing_validators)
 def listing(request, listing_id):
     user = request.user
-    listing = Listing.objects.get(pk=listing_id)
-    if listing is None:
-        return Http404('Listing not found!') 
-    if user.is_authenticated:
-        is_watching = listing in user.watchlist.all()
-        is_owner = listing.owner == user
-    else:
-        is_watching = False
-        is_owner = False
-    bids = listing.bids.all()
-    bid_count = bids.count()
-    highest_bid = bids.order_by('-amount').first() 
-    if highest_bid is None:
-        is_highest_bidder = False
-    else:
-        is_highest_bidder = highest_bid.bidder == user
-    category = listing.get_category_display()
-    comments = listing.comments.order_by('timestamp')
-    is_winner = user == listing.winner
+    bid_form = BidForm()
+    max_bid_form = MaxBidForm()
+    comment_form = CommentForm()
     if request.method == 'POST':
         if not user.is_authenticated:
             return HttpResponseRedirect(reverse('login'))
+        try:
+            listing = Listing.objects.get(pk=listing_id)
+        except Listing.DoesNotExist:
+            raise Http404('Listing not found!')
         if request.POST['type'] == 'bid' and listing.is_active:
-            if user == listing.owner:
+            if user.pk == listing.owner_id:
                 return HttpResponse('Cannot post bid as the owner!') 
             bid = Bid(listing=listing, bidder=user)
             bid_form = BidForm(request.POST, instance=bid) 
             if bid_form.is_valid():
-                bid_form.save()
-                listing.price = bid_form.cleaned_data['amount']
-                listing.save(update_fields=['price'])
-            else:
-                return render(request, 'auctions/listing.html', {
-                    'user': user,
-                    'listing': listing,
-                    'is_watching': is_watching,
-                    'is_owner': is_owner,
-                    'is_winner': is_winner,
-                    'close_auction_form': CloseAuctionForm(),
-                    'bid_count': bid_count,
-                    'is_highest_bidder': is_highest_bidder,
-                    'bid_form': bid_form,
-                    'comment_form': CommentForm(), 
-                    'category': category,
-                    'comments': comments
-                })
+                result = place_bid(listing.pk, user, bid_form.cleaned_data['amount'])
+                if result.status == OUTBID and result.bid:
+                    bid_form.add_error('amount', f"Another bidder's maximum bid is higher. The price is now ${result.price}.")
+                elif result.status == OUTBID:
+                    bid_form.add_error('amount', "Bid must be higher than the current price!")
+                elif result.status == CLOSED:
+                    bid_form.add_error(None, "This auction has closed.")
+                else:
+                    bid_form = BidForm()
+        elif request.POST['type'] == 'max_bid' and listing.is_active:
+            if user.pk == listing.owner_id:
+                return HttpResponse('Cannot post bid as the owner!')
+            max_bid_form = MaxBidForm(request.POST, listing=listing)
+            if max_bid_form.is_valid():
+                result = place_max_bid(listing.pk, user, max_bid_form.cleaned_data['max_amount'])
+                if result.status == OUTBID and result.bid:
+                    max_bid_form.add_error('max_amount', f"Another bidder's maximum bid is higher. The price is now ${result.price}.")
+                elif result.status == OUTBID:
+                    max_bid_form.add_error('max_amount', "Maximum bid must be higher than the current price!")
+                elif result.status == CLOSED:
+                    max_bid_form.add_error(None, "This auction has closed.")
+                else:
+                    max_bid_form = MaxBidForm()
         elif request.POST['type'] == 'comment':
             comment = Comment(author=user, listing=listing)
             comment_form = CommentForm(request.POST, instance=comment)
-            if comment_form.is_valid():
+            if listing.archived_at is not None:
+                comment_form.add_error(None, "This auction has been archived and no longer takes comments.")
+            elif comment_form.is_valid():
                 comment_form.save()
-            else:
-                return render(request, 'auctions/listing.html', {
-                    'user': user,
-                    'listing': listing,
-                    'is_watching': is_watching,
-                    'is_owner': is_owner,
-                    'is_winner': is_winner,
-                    'close_auction_form': CloseAuctionForm(),
-                    'bid_count': bid_count,
-                    'is_highest_bidder': is_highest_bidder,
-                    'bid_form': BidForm(),
-                    'comment_form': comment_form, 
-                    'category': category,
-                    'comments': comments
-                })
-        elif request.POST['type'] == 'close_auction':
+                comment_form = CommentForm()
+        elif request.POST['type'] == 'close_auction' and user.pk == listing.owner_id:
             close = CloseAuctionForm(request.POST)
             if close.is_valid():
-                listing.is_active = False
-                listing.winner = highest_bid.bidder
-                listing.save(update_fields=['is_active', 'winner'])
+                with transaction.atomic():
+                    # Only the request that actually closes the auction (not a second click,
+                    # nor the closer getting there first) picks the winner and notifies them.
+                    if Listing.objects.filter(pk=listing.pk).close(timezone.now()):
+                        winner_id, price = Listing.objects.filter(pk=listing.pk).values_list('winner_id', 'price').get()
+                        if winner_id:
+                            Notification.objects.create(
+                                kind=Notification.WON, recipient_id=winner_id, listing=listing, amount=price,
+                            )
+                        # update() bypasses the post_save signal.
+                        transaction.on_commit(lambda: publish_listing_state(listing.pk))
+    # Everything that looks the same to every visitor comes from the snapshot
+    # cached for the listing's current updated_at; only the per-user parts
+    # come from viewer_state on each request.
+    viewer = getattr(request, 'listing_viewer_state', None) or viewer_state(request, listing_id)
+    if viewer is None:
+        raise Http404('Listing not found!')
+    snapshot = listing_snapshot(listing_id, viewer['updated_at'])
+    if snapshot is None:
+        raise Http404('Listing not found!')
+    highest_bidder_id = snapshot['highest_bidder_id']
     return render(request, 'auctions/listing.html', {
         'user': user,
-        'listing': listing,
-        'is_watching': is_watching,
-        'bid_count': bid_count,
-        'is_highest_bidder': is_highest_bidder,
-        'is_winner': is_winner,
-        'is_owner': is_owner,
-        'close_auction_form': CloseAuctionForm(),
-        'bid_form': BidForm(),
-        'comment_form': CommentForm(),
-        'category': category,
-        'comments': comments
+        'listing': snapshot,
+        'is_watching': viewer.get('is_watching', False),
+        'max_bid': viewer.get('max_bid'),
+        'is_highest_bidder': highest_bidder_id is not None and highest_bidder_id == user.pk,
+        'is_winner': snapshot['winner_id'] is not None and snapshot['winner_id'] == user.pk,
+        'is_owner': snapshot['owner_id'] == user.pk,
+        'bid_form': bid_form,
+        'max_bid_form': max_bid_form,
+        'comment_form': comment_form,
+    })
+
+def listing_snapshot(listing_id, updated_at):
+    # The shared, per-listing part of the listing page, cached under the
+    # listing's updated_at so any bid, comment or listing save invalidates it.
+    key = listing_snapshot_key(listing_id, updated_at)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+    with primary_reads():
+        try:
+            listing = Listing.objects.with_related().get(pk=listing_id)
+        except Listing.DoesNotExist:
+            return None
+        # Once archived, a closed auction's comments live in the archive table.
+        comments = listing.archived_comments if listing.archived_at else listing.comments
+        comments = list(comments.for_display())
+    snapshot = {
+        'id': listing.pk,
+        'title': listing.title,
+        'is_active': listing.is_active,
+        'is_archived': listing.archived_at is not None,
+        'owner_id': listing.owner_id,
+        'winner_id': listing.winner_id,
+        'winner_name': str(listing.winner or listing.owner),
+        'highest_bidder_id': listing.highest_bid.bidder_id if listing.highest_bid else None,
+        'summary_html': render_to_string('auctions/listing_summary.html', {'listing': listing}),
+        'details_html': render_to_string('auctions/listing_details.html', {'listing': listing}),
+        'comments_html': render_to_string('auctions/listing_comments.html', {'comments': comments}),
+    }
+    cache.set(key, snapshot, settings.LISTING_CACHE_TIMEOUT)
+    return snapshot
+
+async def listing_events(request, listing_id):
+    # Server-Sent Events stream of the listing's price, bid count and status.
+    # Each watcher is a coroutine, so idle watchers cost no thread under ASGI.
+    try:
+        state = await sync_to_async(listing_state)(listing_id)
+    except Listing.DoesNotExist:
+        raise Http404('Listing not found!')
+    if not state['is_active']:
+        # The page's script stops listening once it sees the auction closed.
+        return HttpResponse(server_sent_event(state), content_type='text/event-stream')
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be tied up for the life of the stream, so send
+        # the current state once and have the browser come back only slowly.
+        return HttpResponse(
+            f'retry: {settings.LISTING_EVENTS_POLL_MS}\n' + server_sent_event(state), content_type='text/event-stream',
+        )
+    response = StreamingHttpResponse(listing_event_stream(listing_id, state), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def listing_event_stream(listing_id, state):
+    # Django 4.2 doesn't notice a client going away mid-stream, and ASGI servers
+    # drop writes to a closed connection silently, so a stream would otherwise
+    # hold its subscription until the auction closes. Ending every stream after
+    # LISTING_EVENTS_MAX_AGE bounds that; EventSource reconnects by itself after
+    # the `retry:` delay, which costs a live client one listing_state() query.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.LISTING_EVENTS_MAX_AGE
+    queue = hub.subscribe(listing_id)
+    try:
+        yield f'retry: {settings.LISTING_EVENTS_RETRY_MS}\n' + server_sent_event(state)
+        while state['is_active']:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                state = await asyncio.wait_for(queue.get(), min(settings.LISTING_EVENTS_HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield server_sent_event(state)
+    finally:
+        hub.unsubscribe(listing_id, queue)
+
+def server_sent_event(state):
+    return f'event: listing\ndata: {json.dumps(state)}\n\n'
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        ids, next_cursor = search_listing_ids(query, request.GET.get('cursor'), settings.LISTINGS_PAGE_SIZE)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    listings = Listing.objects.cards().in_bulk(ids)
+    return render(request, 'auctions/search.html', {
+        'query': query,
+        'listings': [listings[pk] for pk in ids if pk in listings],
+        'next_cursor': next_cursor,
     })
 
 def categories(request):
-    categories = [entry[1] for entry in Listing.CATEGORIES] 
+    counts = category_counts()
     return render(request, 'auctions/categories.html', {
-        'categories': categories
+        'categories': [(name, counts.get(code, 0)) for code, name in Listing.CATEGORIES]
     })
 
+def category_validators(request, category):
+    # The page's own rows, from the same keyset query the view runs but only
+    # as far as the page size, rather than the whole category.
+    sort = request.GET.get('sort', 'new')
+    if category not in CATEGORY_CODES or sort not in LISTING_SORTS:
+        return None
+    ordering = LISTING_SORTS[sort]
+    rows = Listing.objects.active().filter(category=CATEGORY_CODES[category]).values(
+        'updated_at', *[key.lstrip('-') for key in ordering]
+    )
+    try:
+        rows, next_cursor = keyset_page(rows, request.GET.get('cursor'), ordering, settings.LISTINGS_PAGE_SIZE)
+    except InvalidCursor:
+        return None
+    return ([(row['id'], row['updated_at']) for row in rows], next_cursor), None
+
+@conditional_page(category_validators)
 def category(request, category):
-    categories = [entry[1] for entry in Listing.CATEGORIES] 
-    if category not in categories:
-        return Http404(f"Couldn't find category { category }")
-    category_code = [entry[0] for entry in Listing.CATEGORIES if entry[1] == category][0]   
-    listings = Listing.objects.filter(category=category_code)
+    if category not in CATEGORY_CODES:
+        raise Http404(f"Couldn't find category { category }")
+    sort = request.GET.get('sort', 'new')
+    if sort not in LISTING_SORTS:
+        return HttpResponseBadRequest('Invalid sort')
+    listings = Listing.objects.active().filter(category=CATEGORY_CODES[category]).cards()
+    try:
+        listings, next_cursor = keyset_page(
+            listings, request.GET.get('cursor'), LISTING_SORTS[sort], settings.LISTINGS_PAGE_SIZE
+        )
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
     return render(request, 'auctions/category.html', {
         'category': category,
         'listings': listings,
+        'sort': sort,
+        'next_cursor': next_cursor,
+        'is_first_page': 'cursor' not in request.GET,
     })
+def watchlist_validators(request):
+    if not request.user.is_authenticated:
+        return None
+    return request.user.watchlist.fingerprint(), None
+
+@conditional_page(watchlist_validators)
 def watchlist(request):
     if not request.user.is_authenticated:
         return HttpResponseRedirect(reverse('login'))
     user = request.user
     return render(request, 'auctions/watchlist.html',{
         'user': user,
-        'watchlist': user.watchlist.all()
+        'watchlist': user.watchlist.cards()
     })
 def watchlist_add(request, listing_id):
     if not request.user.is_authenticated:
         return HttpResponseRedirect(reverse('login'))
     user = request.user
-    listing = Listing.objects.get(pk=listing_id)
-    if listing is None:
-        return Http404(f"Coudn't find listing with id of {listing_id}")
-    user.watchlist.add(listing) 
+    # Only a new watcher makes the listing hotter, so adding it twice doesn't count twice.
+    # A closed listing keeps the updated_at of its close, which archive_auctions goes by.
+    added = Listing.objects.active().filter(pk=listing_id).exclude(watchers=user).update(
+        hot_score=add_hot_points(settings.HOT_WEIGHTS['watch']), updated_at=timezone.now(),
+    )
+    if not added and not Listing.objects.filter(pk=listing_id).exists():
+        raise Http404(f"Coudn't find listing with id of {listing_id}")
+    user.watchlist.add(listing_id)
     return HttpResponseRedirect(reverse('listing', args=[listing_id]))
 
 def watchlist_remove(request, listing_id):
     if not request.user.is_authenticated:
         return HttpResponseRedirect(reverse('login'))
     user = request.user
-    listing = Listing.objects.get(pk=listing_id)
-    if listing is None:
-        return Http404(f"Coudn't find listing with id of {listing_id}")
-    user.watchlist.remove(listing) 
-    return HttpResponseRedirect(reverse('listing', args=[listing_id]))
\ No newline at end of file
+    if not Listing.objects.filter(pk=listing_id).exists():
+        raise Http404(f"Coudn't find listing with id of {listing_id}")
+    user.watchlist.remove(listing_id)
+    return HttpResponseRedirect(reverse('listing', args=[listing_id]))
+
+def dashboard(request):
+    if not request.user.is_authenticated:
+        return HttpResponseRedirect(reverse('login'))
+    user = request.user
+    size = settings.DASHBOARD_SECTION_SIZE
+    # One query per section, however many bids the user has made. Each row
+    # carries the section's full size in a COUNT(*) OVER () window, computed
+    # before the LIMIT, so there's no separate count query.
+    total = Window(Count('*'))
+    selling = list(
+        Listing.objects.filter(owner=user).select_related('winner')
+        .only('id', 'title', 'price', 'bid_count', 'is_active', 'ends_at', 'winner__username')
+        .annotate(total=total).order_by('-is_active', '-timestamp', '-id')[:size]
+    )
+    # The listing's denormalized highest bid tells whether the user leads, so
+    # the user's bids are grouped per listing without looking at anyone else's.
+    bidding = list(
+        Bid.objects.filter(bidder=user, listing__is_active=True)
+        .values('listing_id', 'listing__title', 'listing__price', 'listing__ends_at', 'listing__highest_bid__bidder_id')
+        .annotate(my_bid=Max('amount'), last_bid=Max('id'), total=total)
+        .order_by('-last_bid')[:size]
+    )
+    for row in bidding:
+        row['is_leading'] = row['listing__highest_bid__bidder_id'] == user.pk
+    won = list(
+        user.listings_won.only('id', 'title', 'price', 'updated_at')
+        .annotate(total=total).order_by('-updated_at', '-id')[:size]
+    )
+    return render(request, 'auctions/dashboard.html', {
+        'selling': selling,
+        'selling_total': selling[0].total if selling else 0,
+        'bidding': bidding,
+        'bidding_total': bidding[0]['total'] if bidding else 0,
+        'won': won,
+        'won_total': won[0].total if won else 0,
+    })
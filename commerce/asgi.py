@@ -3,6 +3,10 @@ ASGI config for commerce project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through this entry point (e.g. ``uvicorn commerce.asgi:application``)
+to get live listing updates: the Server-Sent Events view in ``auctions.views`` is async
+and only streams under ASGI, where idle watchers don't hold a worker thread each.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
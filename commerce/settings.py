@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+from decimal import Decimal
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'auctions.middleware.RequestTimingMiddleware',
+    'auctions.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +57,7 @@ ROOT_URLCONF = 'commerce.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'auctions.timing.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,6 +84,38 @@ DATABASES = {
     }
 }
 
+# Read replicas for browse traffic, as a comma-separated list of database files
+# in COMMERCE_REPLICA_DBS. Locally these can be copies of db.sqlite3 kept fresh
+# by `manage.py refresh_replica`. Tests read the primary through them.
+REPLICA_DATABASES = []
+for number, path in enumerate(filter(None, os.environ.get('COMMERCE_REPLICA_DBS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['auctions.routers.ReplicaRouter']
+
+# COMMERCE_DB_PROFILE=production tunes SQLite for concurrent use: write-ahead logging so
+# readers and the writer don't block each other, fewer fsyncs (still safe with WAL), a
+# memory-mapped file and a bigger page cache, waiting up to 5s for the write lock instead
+# of failing with "database is locked", and connections kept open between requests.
+# The pragmas are applied to each new connection by auctions.signals.configure_sqlite.
+SQLITE_PRAGMAS = {}
+if os.environ.get('COMMERCE_DB_PROFILE') == 'production':
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # In KiB when negative, so 64 MiB.
+        'busy_timeout': 5000,
+    }
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 600
+        database['CONN_HEALTH_CHECKS'] = True
+
 AUTH_USER_MODEL = 'auctions.User'
 
 # Password validation
@@ -101,6 +136,28 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Every login and registration spends PASSWORD_ITERATIONS rounds of PBKDF2 on the
+# password, so this sets the CPU cost of each one. Hashes made with a different
+# count (including Django's default) are rehashed on the user's next login.
+PASSWORD_HASHERS = [
+    'auctions.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_ITERATIONS = int(os.environ.get('COMMERCE_PASSWORD_ITERATIONS', 600000))
+
+# Token buckets in front of password checks (see auctions.throttling), as
+# (burst, seconds to refill it). Attempts over the limit get a 429 without hashing
+# anything. Remove a scope to turn its throttle off.
+AUTH_THROTTLE_RATES = {
+    'login_ip': (20, 60),
+    'login_username': (5, 60),
+    'register_ip': (5, 600),
+    'register_username': (3, 60),
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
@@ -120,3 +177,139 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.environ.get('COMMERCE_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+# Outside development, collectstatic writes content-hashed copies of every file plus
+# precompressed .gz (and .br, with the brotli package) variants, which
+# auctions.assets.serve hands out with far-future cache headers.
+if not DEBUG:
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'auctions.assets.CompressedManifestStaticFilesStorage',
+        },
+    }
+
+# Auctions
+
+# Number of listings per page in the keyset-paginated listing feeds.
+LISTINGS_PAGE_SIZE = 25
+
+# Listings' hot scores (auctions.models.hot_points) rank them by recent activity:
+# each new listing, bid, watcher and comment adds its weight, and that counts
+# half as much every HOT_HALF_LIFE seconds. The index page shows the
+# TRENDING_SIZE hottest active listings.
+HOT_HALF_LIFE = 24 * 60 * 60
+HOT_WEIGHTS = {
+    'listing': 1.0,
+    'bid': 3.0,
+    'watch': 2.0,
+    'comment': 1.0,
+}
+TRENDING_SIZE = 5
+
+# Most listings shown in each section of the dashboard (selling, bidding, won).
+DASHBOARD_SECTION_SIZE = 50
+
+# Largest page a JSON API client may ask for with ?limit=.
+API_MAX_PAGE_SIZE = 100
+
+# Most bids one request to the batch bid endpoint (api/v1/bids) may place.
+API_MAX_BIDS = 100
+
+# How often bidding.place_bid() retries a bid that hit a locked SQLite database,
+# and the base backoff in seconds (doubled on each attempt).
+BID_BUSY_RETRIES = 5
+BID_BUSY_BACKOFF = 0.01
+
+# How far a maximum (proxy) bid outbids its closest rival, when its maximum allows.
+BID_INCREMENT = Decimal('1.00')
+
+# The listing page caches its shared fragments per listing, keyed on the listing's
+# updated_at, so writes from any process (the closer, imports, other workers) show
+# at once. A shared cache (e.g. Memcached or Redis) lets the workers share them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Sessions get their own cache so listing data can't evict them. Set
+    # COMMERCE_SESSION_CACHE_DIR to keep them in files shared by every worker
+    # process on the host instead of in each process's memory.
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+    },
+}
+if os.environ.get('COMMERCE_SESSION_CACHE_DIR'):
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['COMMERCE_SESSION_CACHE_DIR'],
+    }
+
+LISTING_CACHE_TIMEOUT = 60 * 60
+
+# Sessions are read from the cache and written through to the database by default
+# (cached_db), so a cache miss costs one query rather than the session. Set
+# COMMERCE_SESSION_ENGINE=cache to skip the database entirely, or =db for no caching.
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('COMMERCE_SESSION_ENGINE', 'cached_db')
+SESSION_CACHE_ALIAS = 'sessions'
+
+# The signed-in user is cached for this many seconds between requests (see
+# auctions.backends.CachedModelBackend); saving or deleting the user clears it.
+AUTHENTICATION_BACKENDS = ['auctions.backends.CachedModelBackend']
+USER_CACHE_TIMEOUT = 60
+
+# Read-only views whose GETs may read from REPLICA_DATABASES, and how long a client
+# that wrote something reads only from the primary afterwards.
+REPLICA_VIEWS = [
+    'index', 'search', 'categories', 'category', 'listing', 'watchlist', 'dashboard',
+    'api_listings', 'api_listing', 'api_listing_bids', 'api_listing_comments',
+]
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE_NAME = 'read_primary'
+
+# Seconds between keep-alive comments on idle listing event streams.
+LISTING_EVENTS_HEARTBEAT = 15
+# Seconds before a listing event stream ends, and the milliseconds the browser
+# waits before reconnecting. Dead connections go unnoticed, so this is how long
+# one can keep its subscription.
+LISTING_EVENTS_MAX_AGE = 5 * 60
+LISTING_EVENTS_RETRY_MS = 1000
+# Without ASGI there is no stream, just the current state; the browser asks
+# again after this many milliseconds, so each open listing tab polls slowly.
+LISTING_EVENTS_POLL_MS = 60 * 1000
+
+# Outbid and won emails queued in the Notification outbox are sent by
+# `manage.py dispatch_notifications` through this backend. Use
+# django.core.mail.backends.filebased.EmailBackend with COMMERCE_EMAIL_FILE_PATH to
+# inspect them locally, or configure SMTP for real delivery.
+EMAIL_BACKEND = os.environ.get('COMMERCE_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+if os.environ.get('COMMERCE_EMAIL_FILE_PATH'):
+    EMAIL_FILE_PATH = os.environ['COMMERCE_EMAIL_FILE_PATH']
+DEFAULT_FROM_EMAIL = os.environ.get('COMMERCE_FROM_EMAIL', 'auctions@localhost')
+# Prefixed to listing links in emails, which are sent outside of any request.
+SITE_URL = os.environ.get('COMMERCE_SITE_URL', 'http://localhost:8000')
+
+# Per-request query, SQL, template and view timings as a Server-Timing header and
+# log lines on the 'auctions.timing' logger. Off unless COMMERCE_REQUEST_TIMING=1;
+# requests slower than REQUEST_TIMING_SLOW_MS also get their SQL logged.
+REQUEST_TIMING = os.environ.get('COMMERCE_REQUEST_TIMING') == '1'
+REQUEST_TIMING_SLOW_MS = int(os.environ.get('COMMERCE_REQUEST_TIMING_SLOW_MS', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'auctions': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
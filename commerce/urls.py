@@ -13,10 +13,18 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from auctions import assets
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("auctions.urls"))
-]
\ No newline at end of file
+]
+
+# runserver serves static files itself while DEBUG is on; otherwise serve the
+# collected, hashed files (unless a web server in front already does).
+if not settings.DEBUG:
+    urlpatterns.append(re_path(r"^%s(?P<path>.+)$" % settings.STATIC_URL.lstrip("/"), assets.serve))
\ No newline at end of file